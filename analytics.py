@@ -4,98 +4,131 @@ Price trends, market insights, time-on-market tracking
 """
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Tuple
-from collections import defaultdict
-import statistics
+from functools import wraps
+import threading
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
+# Rows pulled per fetchmany() call when streaming large result sets
+FETCH_BATCH_SIZE = 10000
+
+# Horizontal rule used in report headers
+REPORT_SEPARATOR = "─" * 30
+
+# Labels for the integer price buckets in get_market_insights
+PRICE_RANGE_LABELS = ("Under 3K", "3K-5K", "5K-7K", "7K-10K", "10K-15K", "15K+")
+
+# SQL expression used to group the daily price summary in get_price_trends
+_TREND_GROUP_COLUMNS = {
+    'neighborhood': 'neighborhood',
+    'city': 'city',
+}
+
+
+def cached(ttl: int):
+    """
+    Cache a MarketAnalytics method result for `ttl` seconds.
+    Calls that pass any non-None argument bypass the cache.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(self, *args, **kwargs):
+            if any(arg is not None for arg in (*args, *kwargs.values())):
+                return func(self, *args, **kwargs)
+
+            key = func.__name__
+            now = time.monotonic()
+            with self._cache_lock:
+                entry = self._cache.get(key)
+                if entry and entry[0] > now:
+                    return entry[1]
+
+            value = func(self, *args, **kwargs)
+            with self._cache_lock:
+                self._cache[key] = (now + ttl, value)
+            return value
+        return wrapper
+    return decorator
+
 
 class MarketAnalytics:
     """Analyzes market data and provides insights"""
 
     def __init__(self, database):
         self.db = database
+        self._cache: Dict[str, Tuple[float, Dict]] = {}
+        self._cache_lock = threading.Lock()
+
+    def invalidate(self):
+        """Drop cached insights after apartments or prices change"""
+        with self._cache_lock:
+            self._cache.clear()
 
     def get_price_trends(self, days: int = 30, group_by: str = 'neighborhood') -> Dict:
         """
         Calculate price trends over time.
         group_by: 'neighborhood', 'city', or 'all'
         """
+        self.db.refresh_daily_price_summary()
+
         with self.db.get_connection() as conn:
             cursor = conn.cursor()
 
-            cutoff = (datetime.now() - timedelta(days=days)).isoformat()
-
-            # Get price history with apartment details
-            cursor.execute('''
-                SELECT a.neighborhood, a.city, a.rooms,
-                       ph.price, ph.recorded_at,
-                       a.first_seen
-                FROM price_history ph
-                JOIN apartments a ON ph.apartment_id = a.id
-                WHERE ph.recorded_at > ?
-                ORDER BY ph.recorded_at
+            cutoff = (datetime.now() - timedelta(days=days)).date().isoformat()
+            group_col = _TREND_GROUP_COLUMNS.get(group_by, "'all'")
+            cursor.row_factory = None  # plain tuples for the row loop below
+
+            # Re-weight the precomputed daily averages per group
+            cursor.execute(f'''
+                SELECT {group_col} AS grp,
+                       date AS day,
+                       SUM(avg_price * sample_count) / SUM(sample_count) AS avg_price,
+                       SUM(sample_count) AS samples
+                FROM daily_price_summary
+                WHERE date >= ? AND {group_col} IS NOT NULL AND {group_col} != ''
+                GROUP BY grp, day
+                ORDER BY grp, day
             ''', (cutoff,))
 
-            rows = cursor.fetchall()
-
-            if not rows:
+            # Rows arrive ordered by (group, day): keep first/last day per group
+            spans = {}
+            while True:
+                batch = cursor.fetchmany(FETCH_BATCH_SIZE)
+                if not batch:
+                    break
+                for group_name, day, avg_price, samples in batch:
+                    span = spans.get(group_name)
+                    if span is None:
+                        spans[group_name] = [day, avg_price, day, avg_price, 1, samples]
+                    else:
+                        span[2] = day
+                        span[3] = avg_price
+                        span[4] += 1
+                        span[5] += samples
+
+            if not spans:
                 return {'message': 'Not enough data for trend analysis'}
 
-            # Group by specified field
-            if group_by == 'neighborhood':
-                groups = defaultdict(list)
-                for row in rows:
-                    if row['neighborhood']:
-                        groups[row['neighborhood']].append({
-                            'price': row['price'],
-                            'date': row['recorded_at'][:10]
-                        })
-            elif group_by == 'city':
-                groups = defaultdict(list)
-                for row in rows:
-                    if row['city']:
-                        groups[row['city']].append({
-                            'price': row['price'],
-                            'date': row['recorded_at'][:10]
-                        })
-            else:
-                groups = {'all': [{'price': row['price'], 'date': row['recorded_at'][:10]} for row in rows]}
-
             # Calculate trends for each group
             trends = {}
-            for group_name, prices in groups.items():
-                if len(prices) < 2:
-                    continue
-
-                # Group by date
-                by_date = defaultdict(list)
-                for p in prices:
-                    by_date[p['date']].append(p['price'])
-
-                # Calculate daily averages
-                daily_avgs = {date: statistics.mean(prices) for date, prices in sorted(by_date.items())}
-
-                if len(daily_avgs) < 2:
+            for group_name, (first_date, first_avg, last_date, last_avg, day_count, sample_size) in spans.items():
+                if day_count < 2:
                     continue
 
-                dates = list(daily_avgs.keys())
-                first_avg = daily_avgs[dates[0]]
-                last_avg = daily_avgs[dates[-1]]
-
                 change = last_avg - first_avg
                 change_pct = (change / first_avg) * 100 if first_avg > 0 else 0
 
                 trends[group_name] = {
-                    'first_date': dates[0],
-                    'last_date': dates[-1],
+                    'first_date': first_date,
+                    'last_date': last_date,
                     'first_avg_price': round(first_avg),
                     'last_avg_price': round(last_avg),
                     'change': round(change),
                     'change_pct': round(change_pct, 1),
                     'direction': 'up' if change > 0 else 'down' if change < 0 else 'stable',
-                    'sample_size': len(prices)
+                    'sample_size': sample_size
                 }
 
             return {
@@ -151,117 +184,128 @@ class MarketAnalytics:
                 'generated_at': datetime.now().isoformat()
             }
 
+    @cached(ttl=300)
     def get_market_insights(self) -> Dict:
         """Generate market insights and statistics"""
         with self.db.get_connection() as conn:
-            cursor = conn.cursor()
-
-            insights = {}
-
-            # Overall stats
-            cursor.execute('''
-                SELECT COUNT(*) as total,
-                       AVG(price) as avg_price,
-                       MIN(price) as min_price,
-                       MAX(price) as max_price,
-                       AVG(rooms) as avg_rooms,
-                       AVG(sqm) as avg_sqm
-                FROM apartments WHERE is_active = 1
-            ''')
-            overall = cursor.fetchone()
-            insights['overall'] = {
-                'total_listings': overall['total'],
-                'avg_price': round(overall['avg_price']) if overall['avg_price'] else 0,
-                'min_price': overall['min_price'],
-                'max_price': overall['max_price'],
-                'avg_rooms': round(overall['avg_rooms'], 1) if overall['avg_rooms'] else 0,
-                'avg_sqm': round(overall['avg_sqm']) if overall['avg_sqm'] else 0
-            }
-
-            # Price per sqm analysis
+            return self._get_market_insights(conn.cursor())
+
+    def _get_market_insights(self, cursor) -> Dict:
+        """Market insights computed on an existing cursor"""
+        insights = {}
+
+        # Overall stats and weekly activity in a single round-trip
+        week_ago = (datetime.now() - timedelta(days=7)).isoformat()
+        cursor.execute('''
+            SELECT 'overall' as tag, COUNT(*) as count,
+                   AVG(price) as avg_price, MIN(price) as min_price, MAX(price) as max_price,
+                   AVG(rooms) as avg_rooms, AVG(sqm) as avg_sqm
+            FROM apartments WHERE is_active = 1
+            UNION ALL
+            SELECT 'new_this_week', COUNT(*), NULL, NULL, NULL, NULL, NULL
+            FROM apartments WHERE first_seen > ? AND is_active = 1
+            UNION ALL
+            SELECT 'price_changes_this_week', COUNT(DISTINCT apartment_id), NULL, NULL, NULL, NULL, NULL
+            FROM price_history WHERE recorded_at > ?
+        ''', (week_ago, week_ago))
+
+        for row in cursor.fetchall():
+            if row['tag'] == 'overall':
+                insights['overall'] = {
+                    'total_listings': row['count'],
+                    'avg_price': round(row['avg_price']) if row['avg_price'] else 0,
+                    'min_price': row['min_price'],
+                    'max_price': row['max_price'],
+                    'avg_rooms': round(row['avg_rooms'], 1) if row['avg_rooms'] else 0,
+                    'avg_sqm': round(row['avg_sqm']) if row['avg_sqm'] else 0
+                }
+            else:
+                insights[row['tag']] = row['count']
+
+        # Price per sqm analysis
+        cursor.execute('''
+            SELECT COUNT(*) as count,
+                   AVG(price * 1.0 / sqm) as avg,
+                   MIN(price * 1.0 / sqm) as min,
+                   MAX(price * 1.0 / sqm) as max
+            FROM apartments
+            WHERE is_active = 1 AND price > 0 AND sqm > 0
+        ''')
+        sqm_stats = cursor.fetchone()
+
+        if sqm_stats['count']:
+            # Median: average of the one or two middle values
+            count = sqm_stats['count']
             cursor.execute('''
-                SELECT price, sqm, neighborhood, city
+                SELECT price * 1.0 / sqm as pps
                 FROM apartments
                 WHERE is_active = 1 AND price > 0 AND sqm > 0
-            ''')
-            sqm_data = cursor.fetchall()
-
-            if sqm_data:
-                price_per_sqm = [row['price'] / row['sqm'] for row in sqm_data]
-                insights['price_per_sqm'] = {
-                    'avg': round(statistics.mean(price_per_sqm)),
-                    'median': round(statistics.median(price_per_sqm)),
-                    'min': round(min(price_per_sqm)),
-                    'max': round(max(price_per_sqm))
-                }
-
-                # By neighborhood
-                by_neighborhood = defaultdict(list)
-                for row in sqm_data:
-                    if row['neighborhood']:
-                        by_neighborhood[row['neighborhood']].append(row['price'] / row['sqm'])
-
-                insights['price_per_sqm_by_neighborhood'] = {
-                    n: round(statistics.mean(prices))
-                    for n, prices in by_neighborhood.items()
-                    if len(prices) >= 3
-                }
-
-            # New listings this week
-            week_ago = (datetime.now() - timedelta(days=7)).isoformat()
-            cursor.execute('''
-                SELECT COUNT(*) as count FROM apartments
-                WHERE first_seen > ? AND is_active = 1
-            ''', (week_ago,))
-            insights['new_this_week'] = cursor.fetchone()['count']
-
-            # Price changes this week
-            cursor.execute('''
-                SELECT COUNT(DISTINCT apartment_id) as count
-                FROM price_history
-                WHERE recorded_at > ?
-            ''', (week_ago,))
-            insights['price_changes_this_week'] = cursor.fetchone()['count']
+                ORDER BY pps
+                LIMIT ? OFFSET ?
+            ''', (2 - count % 2, (count - 1) // 2))
+            middle = [row['pps'] for row in cursor.fetchall()]
+
+            insights['price_per_sqm'] = {
+                'avg': round(sqm_stats['avg']),
+                'median': round(sum(middle) / len(middle)),
+                'min': round(sqm_stats['min']),
+                'max': round(sqm_stats['max'])
+            }
 
-            # Most active neighborhoods
+            # By neighborhood
             cursor.execute('''
-                SELECT neighborhood, COUNT(*) as count
+                SELECT neighborhood, AVG(price * 1.0 / sqm) as avg
                 FROM apartments
-                WHERE is_active = 1 AND neighborhood IS NOT NULL
+                WHERE is_active = 1 AND price > 0 AND sqm > 0
+                AND neighborhood IS NOT NULL AND neighborhood != ''
                 GROUP BY neighborhood
-                ORDER BY count DESC
-                LIMIT 10
+                HAVING COUNT(*) >= 3
             ''')
-            insights['top_neighborhoods'] = [
-                {'name': row['neighborhood'], 'count': row['count']}
+            insights['price_per_sqm_by_neighborhood'] = {
+                row['neighborhood']: round(row['avg'])
                 for row in cursor.fetchall()
-            ]
-
-            # Price distribution
-            cursor.execute('''
-                SELECT
-                    CASE
-                        WHEN price < 3000 THEN 'Under 3K'
-                        WHEN price < 5000 THEN '3K-5K'
-                        WHEN price < 7000 THEN '5K-7K'
-                        WHEN price < 10000 THEN '7K-10K'
-                        WHEN price < 15000 THEN '10K-15K'
-                        ELSE '15K+'
-                    END as price_range,
-                    COUNT(*) as count
-                FROM apartments
-                WHERE is_active = 1
-                GROUP BY price_range
-                ORDER BY MIN(price)
-            ''')
-            insights['price_distribution'] = [
-                {'range': row['price_range'], 'count': row['count']}
-                for row in cursor.fetchall()
-            ]
-
-            insights['generated_at'] = datetime.now().isoformat()
-            return insights
+            }
 
+        # Most active neighborhoods
+        cursor.execute('''
+            SELECT neighborhood, COUNT(*) as count
+            FROM apartments
+            WHERE is_active = 1 AND neighborhood IS NOT NULL
+            GROUP BY neighborhood
+            ORDER BY count DESC
+            LIMIT 10
+        ''')
+        insights['top_neighborhoods'] = [
+            {'name': row['neighborhood'], 'count': row['count']}
+            for row in cursor.fetchall()
+        ]
+
+        # Price distribution
+        cursor.execute('''
+            SELECT
+                CASE
+                    WHEN price < 3000 THEN 0
+                    WHEN price < 5000 THEN 1
+                    WHEN price < 7000 THEN 2
+                    WHEN price < 10000 THEN 3
+                    WHEN price < 15000 THEN 4
+                    ELSE 5
+                END as bucket,
+                COUNT(*) as count
+            FROM apartments
+            WHERE is_active = 1
+            GROUP BY bucket
+            ORDER BY bucket
+        ''')
+        insights['price_distribution'] = [
+            {'range': PRICE_RANGE_LABELS[row['bucket']], 'count': row['count']}
+            for row in cursor.fetchall()
+        ]
+
+        insights['generated_at'] = datetime.now().isoformat()
+        return insights
+
+    @cached(ttl=600)
     def get_time_on_market(self, apt_id: str = None) -> Dict:
         """
         Calculate time on market for apartments.
@@ -273,7 +317,11 @@ class MarketAnalytics:
 
             if apt_id:
                 cursor.execute('''
-                    SELECT first_seen, last_seen, is_active
+                    SELECT first_seen, last_seen, is_active,
+                           CAST(CASE WHEN is_active
+                               THEN julianday('now', 'localtime') - julianday(first_seen)
+                               ELSE julianday(last_seen) - julianday(first_seen)
+                           END AS INTEGER) as days
                     FROM apartments WHERE id = ?
                 ''', (apt_id,))
                 row = cursor.fetchone()
@@ -281,114 +329,112 @@ class MarketAnalytics:
                 if not row:
                     return {'error': 'Apartment not found'}
 
-                first_seen = datetime.fromisoformat(row['first_seen'])
-                last_seen = datetime.fromisoformat(row['last_seen'])
-
-                if row['is_active']:
-                    days = (datetime.now() - first_seen).days
-                    status = 'active'
-                else:
-                    days = (last_seen - first_seen).days
-                    status = 'removed'
-
                 return {
                     'apartment_id': apt_id,
                     'first_seen': row['first_seen'],
                     'last_seen': row['last_seen'],
-                    'days_on_market': days,
-                    'status': status
+                    'days_on_market': row['days'],
+                    'status': 'active' if row['is_active'] else 'removed'
                 }
 
-            # Statistics for all apartments
-            cursor.execute('''
+            return self._get_time_on_market_stats(cursor)
+
+    def _get_time_on_market_stats(self, cursor) -> Dict:
+        """Time-on-market statistics for all apartments, reduced inside SQLite"""
+        cursor.execute('''
+            WITH listed AS (
                 SELECT
-                    id,
-                    first_seen,
-                    last_seen,
-                    is_active,
-                    julianday(last_seen) - julianday(first_seen) as days_listed
+                    is_active != 0 as active,
+                    CASE WHEN is_active
+                        THEN CAST(julianday('now', 'localtime') - julianday(first_seen) AS INTEGER)
+                        ELSE COALESCE(julianday(last_seen) - julianday(first_seen), 0)
+                    END as days
                 FROM apartments
-            ''')
-            rows = cursor.fetchall()
-
-            if not rows:
-                return {'message': 'No data available'}
-
-            active_days = []
-            removed_days = []
-
-            for row in rows:
-                if row['is_active']:
-                    first = datetime.fromisoformat(row['first_seen'])
-                    days = (datetime.now() - first).days
-                    active_days.append(days)
-                else:
-                    removed_days.append(row['days_listed'] or 0)
-
-            result = {
-                'active_listings': {
-                    'count': len(active_days),
-                    'avg_days': round(statistics.mean(active_days)) if active_days else 0,
-                    'median_days': round(statistics.median(active_days)) if active_days else 0,
-                    'max_days': max(active_days) if active_days else 0
-                },
-                'removed_listings': {
-                    'count': len(removed_days),
-                    'avg_days': round(statistics.mean(removed_days)) if removed_days else 0,
-                    'median_days': round(statistics.median(removed_days)) if removed_days else 0
-                },
-                'generated_at': datetime.now().isoformat()
-            }
+            ),
+            ranked AS (
+                SELECT active, days,
+                       ROW_NUMBER() OVER (PARTITION BY active ORDER BY days) as rn,
+                       COUNT(*) OVER (PARTITION BY active) as cnt
+                FROM listed
+            )
+            SELECT active,
+                   COUNT(*) as count,
+                   AVG(days) as avg_days,
+                   MAX(days) as max_days,
+                   AVG(CASE WHEN rn IN ((cnt + 1) / 2, (cnt + 2) / 2) THEN days END) as median_days
+            FROM ranked
+            GROUP BY active
+        ''')
+        groups = {row['active']: row for row in cursor.fetchall()}
+
+        if not groups:
+            return {'message': 'No data available'}
+
+        active = groups.get(1)
+        removed = groups.get(0)
+
+        result = {
+            'active_listings': {
+                'count': active['count'] if active else 0,
+                'avg_days': round(active['avg_days']) if active else 0,
+                'median_days': round(active['median_days']) if active else 0,
+                'max_days': active['max_days'] if active else 0
+            },
+            'removed_listings': {
+                'count': removed['count'] if removed else 0,
+                'avg_days': round(removed['avg_days']) if removed else 0,
+                'median_days': round(removed['median_days']) if removed else 0
+            },
+            'generated_at': datetime.now().isoformat()
+        }
 
-            return result
+        return result
 
     def get_price_drop_alerts(self, min_drop_pct: float = 5.0) -> List[Dict]:
         """Find apartments with significant price drops"""
         with self.db.get_connection() as conn:
             cursor = conn.cursor()
+            cursor.row_factory = None  # plain tuples for the row loop below
 
-            # Get apartments with multiple price records
+            # Rank each apartment's price records newest-first and compare the latest two
             cursor.execute('''
+                WITH ranked AS (
+                    SELECT apartment_id, price, recorded_at,
+                           ROW_NUMBER() OVER (PARTITION BY apartment_id ORDER BY id DESC) AS rn
+                    FROM price_history
+                )
                 SELECT
                     a.id, a.title, a.link, a.neighborhood, a.city,
-                    ph1.price as old_price,
-                    ph2.price as new_price,
-                    ph1.recorded_at as old_date,
-                    ph2.recorded_at as new_date
+                    r2.price as old_price,
+                    r1.price as new_price,
+                    r2.recorded_at as old_date,
+                    r1.recorded_at as new_date
                 FROM apartments a
-                JOIN price_history ph1 ON a.id = ph1.apartment_id
-                JOIN price_history ph2 ON a.id = ph2.apartment_id
+                JOIN ranked r1 ON r1.apartment_id = a.id AND r1.rn = 1
+                JOIN ranked r2 ON r2.apartment_id = a.id AND r2.rn = 2
                 WHERE a.is_active = 1
-                AND ph2.id = (
-                    SELECT MAX(id) FROM price_history WHERE apartment_id = a.id
-                )
-                AND ph1.id = (
-                    SELECT MAX(id) FROM price_history
-                    WHERE apartment_id = a.id AND id < ph2.id
-                )
-                AND ph1.price > ph2.price
-            ''')
+                AND r2.price > r1.price
+                AND (r2.price - r1.price) * 100.0 / r2.price >= ?
+                ORDER BY (r2.price - r1.price) * 1.0 / r2.price DESC
+            ''', (min_drop_pct,))
 
             drops = []
-            for row in cursor.fetchall():
-                drop = row['old_price'] - row['new_price']
-                drop_pct = (drop / row['old_price']) * 100
-
-                if drop_pct >= min_drop_pct:
-                    drops.append({
-                        'id': row['id'],
-                        'title': row['title'],
-                        'link': row['link'],
-                        'neighborhood': row['neighborhood'],
-                        'old_price': row['old_price'],
-                        'new_price': row['new_price'],
-                        'drop': drop,
-                        'drop_pct': round(drop_pct, 1),
-                        'old_date': row['old_date'],
-                        'new_date': row['new_date']
-                    })
-
-            return sorted(drops, key=lambda x: x['drop_pct'], reverse=True)
+            for apt_id, title, link, neighborhood, _city, old_price, new_price, old_date, new_date in cursor:
+                drop = old_price - new_price
+                drops.append({
+                    'id': apt_id,
+                    'title': title,
+                    'link': link,
+                    'neighborhood': neighborhood,
+                    'old_price': old_price,
+                    'new_price': new_price,
+                    'drop': drop,
+                    'drop_pct': round((drop / old_price) * 100, 1),
+                    'old_date': old_date,
+                    'new_date': new_date
+                })
+
+            return drops
 
     def get_comparison(self, apt_id: str) -> Dict:
         """Compare apartment to market averages"""
@@ -435,86 +481,124 @@ class MarketAnalytics:
 
         return comparison
 
+    def _fetch_weekly_price_delta(self, cursor) -> Optional[Tuple[float, float]]:
+        """Return (first_day_avg, last_day_avg) over the past week, or None if fewer than two days"""
+        cutoff = (datetime.now() - timedelta(days=7)).date().isoformat()
+        cursor.execute('''
+            SELECT SUM(avg_price * sample_count) / SUM(sample_count) AS avg_price
+            FROM daily_price_summary
+            WHERE date IN (
+                (SELECT MIN(date) FROM daily_price_summary WHERE date >= ?),
+                (SELECT MAX(date) FROM daily_price_summary WHERE date >= ?)
+            )
+            GROUP BY date
+            ORDER BY date
+        ''', (cutoff, cutoff))
+        rows = cursor.fetchall()
+        if len(rows) < 2:
+            return None
+        return rows[0]['avg_price'], rows[1]['avg_price']
+
     def generate_weekly_report(self) -> str:
         """Generate a weekly market report in Hebrew"""
-        insights = self.get_market_insights()
-        trends = self.get_price_trends(days=7, group_by='all')
-        time_stats = self.get_time_on_market()
+        self.db.refresh_daily_price_summary()
 
-        report = "📊 <b>דו\"ח שבועי - שוק הדירות</b>\n"
-        report += "─" * 30 + "\n\n"
+        # One connection/read snapshot for all report queries
+        with self.db.get_connection() as conn:
+            cursor = conn.cursor()
+            insights = self._get_market_insights(cursor)
+            time_stats = self._get_time_on_market_stats(cursor)
+            price_delta = self._fetch_weekly_price_delta(cursor)
+
+        overall = insights['overall']
+        parts = []
+        append = parts.append
+
+        append("📊 <b>דו\"ח שבועי - שוק הדירות</b>\n")
+        append(REPORT_SEPARATOR + "\n\n")
 
         # Overall stats
-        report += f"🏠 <b>סיכום כללי:</b>\n"
-        report += f"  • דירות פעילות: {insights['overall']['total_listings']}\n"
-        report += f"  • מחיר ממוצע: ₪{insights['overall']['avg_price']:,}\n"
-        report += f"  • טווח מחירים: ₪{insights['overall']['min_price']:,} - ₪{insights['overall']['max_price']:,}\n\n"
+        append("🏠 <b>סיכום כללי:</b>\n")
+        append(f"  • דירות פעילות: {overall['total_listings']}\n")
+        append(f"  • מחיר ממוצע: ₪{overall['avg_price']:,}\n")
+        append(f"  • טווח מחירים: ₪{overall['min_price']:,} - ₪{overall['max_price']:,}\n\n")
 
         # New listings
-        report += f"🆕 <b>פעילות השבוע:</b>\n"
-        report += f"  • דירות חדשות: {insights['new_this_week']}\n"
-        report += f"  • שינויי מחיר: {insights['price_changes_this_week']}\n\n"
+        append("🆕 <b>פעילות השבוע:</b>\n")
+        append(f"  • דירות חדשות: {insights['new_this_week']}\n")
+        append(f"  • שינויי מחיר: {insights['price_changes_this_week']}\n\n")
 
         # Price trend
-        if trends.get('trends', {}).get('all'):
-            trend = trends['trends']['all']
-            emoji = "📈" if trend['direction'] == 'up' else "📉" if trend['direction'] == 'down' else "➡️"
-            report += f"{emoji} <b>מגמת מחירים:</b>\n"
-            report += f"  • שינוי שבועי: {trend['change_pct']:+.1f}%\n"
-            report += f"  • מ-₪{trend['first_avg_price']:,} ל-₪{trend['last_avg_price']:,}\n\n"
+        if price_delta:
+            first_avg, last_avg = price_delta
+            change = last_avg - first_avg
+            change_pct = round((change / first_avg) * 100, 1) if first_avg > 0 else 0
+            emoji = "📈" if change > 0 else "📉" if change < 0 else "➡️"
+            append(f"{emoji} <b>מגמת מחירים:</b>\n")
+            append(f"  • שינוי שבועי: {change_pct:+.1f}%\n")
+            append(f"  • מ-₪{round(first_avg):,} ל-₪{round(last_avg):,}\n\n")
 
         # Time on market
         if time_stats.get('active_listings'):
-            report += f"⏱️ <b>זמן בשוק:</b>\n"
-            report += f"  • ממוצע: {time_stats['active_listings']['avg_days']} ימים\n"
-            report += f"  • חציון: {time_stats['active_listings']['median_days']} ימים\n\n"
+            append("⏱️ <b>זמן בשוק:</b>\n")
+            append(f"  • ממוצע: {time_stats['active_listings']['avg_days']} ימים\n")
+            append(f"  • חציון: {time_stats['active_listings']['median_days']} ימים\n\n")
 
         # Top neighborhoods
         if insights.get('top_neighborhoods'):
-            report += f"📍 <b>שכונות מובילות:</b>\n"
+            append("📍 <b>שכונות מובילות:</b>\n")
             for n in insights['top_neighborhoods'][:5]:
-                report += f"  • {n['name']}: {n['count']} דירות\n"
+                append(f"  • {n['name']}: {n['count']} דירות\n")
 
-        report += f"\n<i>נוצר: {datetime.now().strftime('%d/%m/%Y %H:%M')}</i>"
+        append(f"\n<i>נוצר: {datetime.now().strftime('%d/%m/%Y %H:%M')}</i>")
 
-        return report
+        return "".join(parts)
 
     def generate_daily_digest(self, new_apartments: List[Dict], price_changes: List[Dict], removed_count: int) -> str:
         """Generate daily digest message"""
-        report = "📬 <b>סיכום יומי</b>\n"
-        report += "─" * 30 + "\n\n"
+        parts = []
+        append = parts.append
+
+        append("📬 <b>סיכום יומי</b>\n")
+        append(REPORT_SEPARATOR + "\n\n")
 
         # New apartments
         if new_apartments:
-            report += f"🆕 <b>{len(new_apartments)} דירות חדשות</b>\n"
+            append(f"🆕 <b>{len(new_apartments)} דירות חדשות</b>\n")
             for apt in new_apartments[:5]:
                 price_str = f"₪{apt['price']:,}" if apt.get('price') else "לא צוין"
-                report += f"  • {apt.get('title', 'ללא כותרת')[:30]} - {price_str}\n"
+                append(f"  • {apt.get('title', 'ללא כותרת')[:30]} - {price_str}\n")
             if len(new_apartments) > 5:
-                report += f"  ... ועוד {len(new_apartments) - 5} דירות\n"
-            report += "\n"
+                append(f"  ... ועוד {len(new_apartments) - 5} דירות\n")
+            append("\n")
 
         # Price changes
         if price_changes:
-            drops = [p for p in price_changes if p.get('change', 0) < 0]
-            increases = [p for p in price_changes if p.get('change', 0) > 0]
+            drops = []
+            increases = []
+            for p in price_changes:
+                change = p.get('change', 0)
+                if change < 0:
+                    drops.append(p)
+                elif change > 0:
+                    increases.append(p)
 
             if drops:
-                report += f"📉 <b>{len(drops)} ירידות מחיר</b>\n"
+                append(f"📉 <b>{len(drops)} ירידות מחיר</b>\n")
                 for p in drops[:3]:
-                    report += f"  • {p['apartment'].get('title', '')[:25]}: ₪{p['old_price']:,} → ₪{p['new_price']:,}\n"
-                report += "\n"
+                    append(f"  • {p['apartment'].get('title', '')[:25]}: ₪{p['old_price']:,} → ₪{p['new_price']:,}\n")
+                append("\n")
 
             if increases:
-                report += f"📈 <b>{len(increases)} עליות מחיר</b>\n"
+                append(f"📈 <b>{len(increases)} עליות מחיר</b>\n")
 
         # Removed
         if removed_count > 0:
-            report += f"🗑️ <b>{removed_count} דירות הוסרו</b>\n\n"
+            append(f"🗑️ <b>{removed_count} דירות הוסרו</b>\n\n")
 
         if not new_apartments and not price_changes and removed_count == 0:
-            report += "😴 אין שינויים היום\n"
+            append("😴 אין שינויים היום\n")
 
-        report += f"\n<i>{datetime.now().strftime('%d/%m/%Y %H:%M')}</i>"
+        append(f"\n<i>{datetime.now().strftime('%d/%m/%Y %H:%M')}</i>")
 
-        return report
+        return "".join(parts)
@@ -12,16 +12,25 @@ Features:
 - Adaptive delay management
 """
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from urllib3.util.request import ACCEPT_ENCODING
+from lxml import etree, html as lxml_html
 import time
 import json
 import os
 import re
 import random
 import logging
+import logging.handlers
 import threading
-from datetime import datetime, timedelta
+import atexit
+import itertools
+import signal
+from datetime import datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
 from typing import Dict, List, Optional, Tuple
+from collections import Counter, deque
 from concurrent.futures import ThreadPoolExecutor
 
 # Import our modules
@@ -30,18 +39,213 @@ from proxy_manager import ProxyManager, ProxyRotator
 from analytics import MarketAnalytics
 from notifications import NotificationManager
 from web import create_web_app, run_web_server
+from config import Config, validate_environment
+from yad2_fast import ITEM_PATH, apartment_id_from_href, hash_text, parse_item_info
+from yad2_fast import extract_price as _extract_price
 
 # Configure logging
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+# Seconds a buffered log line may wait before it is written to the log file
+LOG_FLUSH_SECONDS = 5
+
+
+class TimedMemoryHandler(logging.handlers.MemoryHandler):
+    """MemoryHandler that also flushes flush_interval seconds after the first buffered record"""
+
+    def __init__(self, capacity: int, flushLevel: int, target: logging.Handler, flush_interval: float):
+        super().__init__(capacity, flushLevel=flushLevel, target=target)
+        self.flush_interval = flush_interval
+        self._timer: Optional[threading.Timer] = None
+
+    def emit(self, record: logging.LogRecord):
+        super().emit(record)
+        if self.buffer and self._timer is None:
+            self._timer = threading.Timer(self.flush_interval, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self):
+        with self.lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            super().flush()
+
+
+# Log file writes are buffered; a warning or error, a full buffer, LOG_FLUSH_SECONDS
+# or the end of a cycle flushes them
+_log_file = logging.FileHandler('yad2_monitor.log')
+_log_file.setFormatter(logging.Formatter(LOG_FORMAT))
+LOG_FILE_BUFFER = TimedMemoryHandler(256, logging.WARNING, _log_file, LOG_FLUSH_SECONDS)
 logging.basicConfig(
     level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
+    format=LOG_FORMAT,
     handlers=[
-        logging.FileHandler('yad2_monitor.log'),
+        LOG_FILE_BUFFER,
         logging.StreamHandler()
     ]
 )
 logger = logging.getLogger(__name__)
 
+# Precompiled pattern for listing freshness timestamps embedded in page JSON
+_DATA_UPDATED_AT_RE = re.compile(r'"dataUpdatedAt"\s*:\s*(\d{13})')
+# Page count in the results pagination data embedded in page JSON
+_TOTAL_PAGES_RE = re.compile(r'"(?:totalPages|lastPage|last_page)"\s*:\s*(\d+)')
+
+# Monitor loop error backoff (seconds) and the failure counts that trigger a Telegram alert
+ERROR_BACKOFF_BASE = 60
+ERROR_BACKOFF_MAX = 3600
+ERROR_ALERT_COUNTS = (1, 3, 10)
+
+# Scrape events are buffered and written in one batch every N events or T seconds
+SCRAPE_LOG_FLUSH_EVERY = 20
+SCRAPE_LOG_FLUSH_SECONDS = 30
+# Page request budget: a token bucket holding up to PAGE_BUCKET_CAPACITY requests, refilled at
+# PAGE_REFILL_PER_SECOND (divided by the adaptive multiplier); the rate matches the old 5-15s mean delay
+PAGE_BUCKET_CAPACITY = 6
+PAGE_REFILL_PER_SECOND = 0.1
+# Random extra wait per page so request timing never looks mechanical (seconds)
+PAGE_DELAY_JITTER = (0.5, 2.0)
+
+# Window of scrape events analyze_and_adapt looks at (seconds)
+ADAPT_WINDOW_SECONDS = 24 * 3600
+
+# Scrape events older than this are pruned; adaptation only looks at the last 24h
+SCRAPE_LOG_RETENTION_DAYS = 30
+
+# Response bytes fed to the HTML parser per read
+RESPONSE_CHUNK_SIZE = 65536
+
+# Returned by fetch_page when the server answers 304 to a conditional request
+NOT_MODIFIED = object()
+
+# Captcha page text, scanned for in the raw bytes before any tree lookup
+BLOCK_MARKER = b'Are you for real'
+
+
+def _class_test(class_name: str) -> str:
+    """XPath predicate matching one token of the class attribute"""
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {class_name} ')"
+
+
+# Compiled XPath queries for the listing page (evaluated in libxml2)
+APARTMENT_H2_XPATH = etree.XPath(
+    "//h2[@data-nagish='content-section-title']"
+    f"[not(ancestor::div[{_class_test('yad1-listing-data-content_yad1ListingDataContentBox__nWOxH')}])]"
+)
+CONTAINER_XPATH = etree.XPath("ancestor::*[position() <= 10][self::article or self::div][.//a[@href]][1]")
+LINK_XPATH = etree.XPath("(.//a[@href])[1]")
+TEXT_XPATH = etree.XPath(".//text()[not(parent::script or parent::style)]")
+BLOCK_HEADER_XPATH = etree.XPath(f"(//h1[{_class_test('title')}])[1]")
+# Only text and comment nodes can hold the quoted key (attribute quotes serialize as &quot;)
+DATA_UPDATED_AT_XPATH = etree.XPath(
+    ".//text()[contains(., 'dataUpdatedAt')] | .//comment()[contains(., 'dataUpdatedAt')]"
+)
+
+PAGINATION_SCRIPT_XPATH = etree.XPath(
+    "//script[contains(., 'totalPages') or contains(., 'lastPage') or contains(., 'last_page')]/text()"
+)
+
+# Shared element class lookup for streamed parses
+HTML_ELEMENT_LOOKUP = lxml_html.HtmlElementClassLookup()
+
+
+def _first(xpath, element):
+    """First node matched by a compiled XPath, or None"""
+    found = xpath(element)
+    return found[0] if found else None
+
+
+# Listing span classes located in a single pass over each container
+_SPAN_CLASS_KEYS = {
+    'feed-item-price_price__ygoeF': 'price',
+    'item-data-content_heading__tphH4': 'street',
+    'item-data-content_itemInfoLine__AeoPP': 'info',
+}
+_LOCATOR_KEYS = ('link', 'image', 'price', 'price_testid', 'street', 'info')
+
+
+def _locate(container) -> Dict:
+    """First link, image and listing spans of a container, found in one traversal"""
+    found = dict.fromkeys(_LOCATOR_KEYS)
+    remaining = len(found)
+    for el in container.iter('a', 'img', 'span'):
+        tag = el.tag
+        if tag == 'span':
+            keys = [_SPAN_CLASS_KEYS[c] for c in (el.get('class') or '').split() if c in _SPAN_CLASS_KEYS]
+            if el.get('data-testid') == 'price':
+                keys.append('price_testid')
+        elif tag == 'a':
+            keys = ['link'] if el.get('href') is not None else []
+        else:
+            keys = ['image']
+        for key in keys:
+            if found[key] is None:
+                found[key] = el
+                remaining -= 1
+        if not remaining:
+            break
+    return found
+
+
+def _parse_response(response) -> Tuple[lxml_html.HtmlElement, bool]:
+    """Parse a response body into an lxml tree while its bytes stream in.
+
+    Also reports whether the captcha marker occurs anywhere in the raw body.
+    """
+    parser = etree.HTMLPullParser(encoding=response.encoding or 'utf-8')
+    parser.set_element_class_lookup(HTML_ELEMENT_LOOKUP)
+    overlap = len(BLOCK_MARKER) - 1
+    marker_seen = False
+    tail = b''
+    for chunk in response.iter_content(RESPONSE_CHUNK_SIZE):
+        parser.feed(chunk)
+        if not marker_seen:
+            # Check the chunk plus the seam with the previous one
+            marker_seen = BLOCK_MARKER in chunk or BLOCK_MARKER in tail + chunk[:overlap]
+            tail = (tail + chunk[-overlap:])[-overlap:]
+    return parser.close(), marker_seen
+
+
+def _conditional_headers(response) -> Dict[str, str]:
+    """If-None-Match / If-Modified-Since headers revalidating this response"""
+    headers = {}
+    if response.headers.get('ETag'):
+        headers['If-None-Match'] = response.headers['ETag']
+    if response.headers.get('Last-Modified'):
+        headers['If-Modified-Since'] = response.headers['Last-Modified']
+    return headers
+
+
+def _retry_after(response) -> Optional[float]:
+    """Seconds requested by a Retry-After header (delta-seconds or HTTP date), if any"""
+    value = response.headers.get('Retry-After')
+    if not value:
+        return None
+    if value.strip().isdigit():
+        return float(value)
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+def _total_pages(tree) -> Optional[int]:
+    """Number of result pages advertised by a listing page, if it embeds pagination data"""
+    for script in PAGINATION_SCRIPT_XPATH(tree):
+        match = _TOTAL_PAGES_RE.search(script)
+        if match:
+            return int(match.group(1))
+    return None
+
+
+def _text(element, strip: bool = False) -> str:
+    """Visible text of an element (get_text semantics, scripts and styles skipped)"""
+    strings = TEXT_XPATH(element)
+    if strip:
+        return ''.join(t.strip() for t in strings)
+    return ''.join(strings)
+
 
 def get_database_path():
     """
@@ -86,11 +290,29 @@ def get_database_path():
 class AdaptiveDelayManager:
     """Analyzes historical scraping data and adapts delays to avoid blocks."""
 
-    def __init__(self, database):
+    def __init__(self, database, stop_event: Optional[threading.Event] = None):
         self.db = database
+        # Set on shutdown; every delay below returns early on it
+        self._stop = stop_event or threading.Event()
         self.base_page_delay = (5, 15)
         self.base_cycle_delay = (60, 90)
         self.current_multiplier = 1.0
+        # Shared pause after a rate limit or block, honoured by every fetch worker
+        self._resume_at = 0.0
+        self._pause_lock = threading.Lock()
+        # Page request token bucket shared by the fetch workers
+        self._bucket_tokens = float(PAGE_BUCKET_CAPACITY)
+        self._bucket_updated = time.monotonic()
+        self._bucket_lock = threading.Lock()
+        # (event_type, details, created_at) rows not yet written to scrape_logs
+        self._pending_events: List[Tuple[str, Optional[Dict], str]] = []
+        self._events_lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        atexit.register(self.flush_events)
+        # (epoch seconds, event_type) of the adapt window with running per-type counts;
+        # seeded from the log once, then kept current by log_event
+        self._recent = deque(sorted(self.db.get_scrape_event_times(ADAPT_WINDOW_SECONDS // 3600)))
+        self._recent_counts = Counter(event_type for _, event_type in self._recent)
         self._load_strategy()
 
     def _load_strategy(self):
@@ -113,16 +335,44 @@ class AdaptiveDelayManager:
         self.db.set_setting('last_run_timestamp', str(timestamp_ms))
 
     def log_event(self, event_type: str, details: Dict = None):
-        """Log scraping event"""
-        self.db.log_scrape_event(event_type, details)
+        """Log scraping event (buffered; problems are written and analyzed immediately)"""
+        created_at = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+        now = time.time()
+        with self._events_lock:
+            self._pending_events.append((event_type, details, created_at))
+            self._recent.append((now, event_type))
+            self._recent_counts[event_type] += 1
+            self._expire_recent(now)
+            due = (len(self._pending_events) >= SCRAPE_LOG_FLUSH_EVERY or
+                   time.monotonic() - self._last_flush >= SCRAPE_LOG_FLUSH_SECONDS)
 
         # Analyze and adapt on problems
         if event_type in ["rate_limit", "block"]:
+            self.flush_events()
             self.analyze_and_adapt()
+        elif due:
+            self.flush_events()
+
+    def flush_events(self):
+        """Write buffered scrape events in a single transaction"""
+        with self._events_lock:
+            events, self._pending_events = self._pending_events, []
+            self._last_flush = time.monotonic()
+        if events:
+            self.db.log_scrape_events(events)
+
+    def _expire_recent(self, now: float):
+        """Drop events older than the adapt window; call with _events_lock held"""
+        cutoff = now - ADAPT_WINDOW_SECONDS
+        while self._recent and self._recent[0][0] < cutoff:
+            _, expired_type = self._recent.popleft()
+            self._recent_counts[expired_type] -= 1
 
     def analyze_and_adapt(self):
         """Analyze recent events and adapt strategy"""
-        stats = self.db.get_scrape_stats(hours=24)
+        with self._events_lock:
+            self._expire_recent(time.time())
+            stats = +self._recent_counts
 
         total = sum(stats.values())
         if total < 5:
@@ -135,7 +385,8 @@ class AdaptiveDelayManager:
         success_rate = successes / total
         problem_rate = (blocks + rate_limits) / total
 
-        logger.info(f"📊 Analysis - Last 24h: {total} events, {success_rate:.1%} success, {problem_rate:.1%} problems")
+        logger.info("📊 Analysis - Last 24h: %d events, %.1f%% success, %.1f%% problems",
+                    total, success_rate * 100, problem_rate * 100)
 
         old_multiplier = self.current_multiplier
 
@@ -150,13 +401,43 @@ class AdaptiveDelayManager:
             logger.info(f"🔄 Strategy: multiplier {old_multiplier:.2f} → {self.current_multiplier:.2f}")
             self._save_strategy()
 
+    def pause(self, seconds: float):
+        """Hold all page fetches for at least the given number of seconds"""
+        with self._pause_lock:
+            self._resume_at = max(self._resume_at, time.monotonic() + seconds)
+            resume_at = self._resume_at
+        # Empty the page bucket as of the resume time so it does not refill during the pause
+        with self._bucket_lock:
+            self._bucket_tokens = min(self._bucket_tokens, 0.0)
+            self._bucket_updated = max(self._bucket_updated, resume_at)
+
+    def wait_for_resume(self):
+        """Sleep until any pause set by pause() has elapsed or shutdown is requested"""
+        while not self._stop.is_set():
+            with self._pause_lock:
+                remaining = self._resume_at - time.monotonic()
+            if remaining <= 0:
+                return
+            self._stop.wait(remaining)
+
     def get_page_delay(self) -> float:
-        """Get adaptive page delay"""
+        """Reserve a page request from the token bucket; returns how long to wait before sending it"""
+        refill = PAGE_REFILL_PER_SECOND / self.current_multiplier
+        with self._bucket_lock:
+            now = time.monotonic()
+            # _bucket_updated is in the future while a pause is running: no refill until then
+            self._bucket_tokens = min(PAGE_BUCKET_CAPACITY,
+                                      self._bucket_tokens + max(0.0, now - self._bucket_updated) * refill)
+            self._bucket_updated = max(now, self._bucket_updated)
+            # Tokens may go negative: concurrent callers queue behind each other's reservations
+            self._bucket_tokens -= 1
+            wait = max(0.0, -self._bucket_tokens / refill)
+        return wait + random.uniform(*PAGE_DELAY_JITTER)
+
+    def get_retry_delay(self, attempt: int) -> float:
+        """Extra backoff before retry number `attempt` of a page"""
         base_min, base_max = self.base_page_delay
-        return random.uniform(
-            base_min * self.current_multiplier,
-            base_max * self.current_multiplier
-        )
+        return random.uniform(base_min, base_max) * attempt * self.current_multiplier
 
     def get_cycle_delay(self) -> int:
         """Get adaptive cycle delay in seconds"""
@@ -170,22 +451,48 @@ class AdaptiveDelayManager:
 class Yad2Monitor:
     """Main monitor class with all features integrated"""
 
-    def __init__(self):
+    def __init__(self, config: Config):
         logger.info("🚀 Initializing Enhanced Yad2Monitor")
+        self.config = config
 
         # Initialize database with persistent storage support
         # get_database() auto-detects PostgreSQL (DATABASE_URL) or SQLite
         self.db = get_database()
 
+        # Set by stop(); the monitor loop's waits and the scrape delays return early on it
+        self._stop = threading.Event()
+
         # Initialize components
-        self.delay_manager = AdaptiveDelayManager(self.db)
+        self.delay_manager = AdaptiveDelayManager(self.db, self._stop)
+        self.delay_manager.base_cycle_delay = (config.MIN_INTERVAL_MINUTES, config.MAX_INTERVAL_MINUTES)
         self.proxy_manager = ProxyManager()
         self.proxy_rotator = ProxyRotator(self.proxy_manager)
         self.analytics = MarketAnalytics(self.db)
 
+        # Persistent HTTP session so pages reuse keep-alive connections.
+        # Connection errors, timeouts and 5xx are retried with backoff by urllib3;
+        # 429 (even with Retry-After) and captcha pages are left to fetch_page so they
+        # feed the delay manager.
+        retry = Retry(total=3, backoff_factor=2, status_forcelist=(500, 502, 503, 504),
+                      allowed_methods=frozenset(['GET']), raise_on_status=False,
+                      respect_retry_after_header=False)
+        # The pool blocks at one socket per fetch worker per host instead of opening extras.
+        self._fetch_workers = config.PAGE_FETCH_WORKERS
+        self.session = requests.Session()
+        self.session.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=self._fetch_workers,
+                                                   pool_block=True, max_retries=retry))
+
+        # Long-lived page fetch workers, reused across scrape cycles
+        self._fetch_pool = ThreadPoolExecutor(max_workers=self._fetch_workers, thread_name_prefix='page-fetch')
+        atexit.register(self._fetch_pool.shutdown, wait=True)
+
+        # Single notification worker: Telegram sends overlap the next scrape, in order
+        self._notify_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='notify')
+        atexit.register(self._notify_pool.shutdown, wait=True)
+
         # Telegram bot for multi-user support
-        telegram_token = os.environ.get("TELEGRAM_BOT_TOKEN")
-        telegram_chat_id = os.environ.get("TELEGRAM_CHAT_ID")
+        telegram_token = config.TELEGRAM_BOT_TOKEN
+        telegram_chat_id = config.TELEGRAM_CHAT_ID
 
         try:
             from telegram_bot import TelegramBot
@@ -203,13 +510,36 @@ class Yad2Monitor:
         self.search_urls = self._load_search_urls()
 
         # User agents for rotation
-        self.user_agents = [
+        self.user_agents = (
             'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 Chrome/120.0.0.0 Safari/537.36',
             'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 Chrome/120.0.0.0 Safari/537.36',
             'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:121.0) Gecko/20100101 Firefox/121.0',
             'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 Safari/605.1.15',
             'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 Chrome/120.0.0.0 Safari/537.36',
-        ]
+        )
+
+        # Static request headers; only the User-Agent rotates per request
+        self._base_headers = {
+            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+            'Accept-Language': 'he-IL,he;q=0.9,en-US;q=0.8,en;q=0.7',
+            # Only codings urllib3 can decode here (br/zstd when brotli/zstandard are installed)
+            'Accept-Encoding': ACCEPT_ENCODING,
+            'DNT': '1',
+            'Connection': 'keep-alive',
+            'Upgrade-Insecure-Requests': '1',
+            'Sec-Fetch-Dest': 'document',
+            'Sec-Fetch-Mode': 'navigate',
+            'Sec-Fetch-Site': 'none',
+            'Cache-Control': 'max-age=0'
+        }
+        # One complete header set per User-Agent, built once
+        self._header_variants = tuple({'User-Agent': ua, **self._base_headers} for ua in self.user_agents)
+
+        # Per page URL: validators from the last 200 and the listings parsed from it
+        self._page_validators: Dict[str, Dict[str, str]] = {}
+        self._page_apartments: Dict[str, List[Dict]] = {}
+        # Per search URL: result page count read from its first page
+        self._total_pages: Dict[str, int] = {}
 
         # Web server thread
         self.web_thread = None
@@ -233,166 +563,114 @@ class Yad2Monitor:
         return urls
 
     def get_headers(self) -> Dict:
-        """Get request headers with random user agent"""
-        return {
-            'User-Agent': random.choice(self.user_agents),
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-            'Accept-Language': 'he-IL,he;q=0.9,en-US;q=0.8,en;q=0.7',
-            'Accept-Encoding': 'gzip, deflate, br',
-            'DNT': '1',
-            'Connection': 'keep-alive',
-            'Upgrade-Insecure-Requests': '1',
-            'Sec-Fetch-Dest': 'document',
-            'Sec-Fetch-Mode': 'navigate',
-            'Sec-Fetch-Site': 'none',
-            'Cache-Control': 'max-age=0'
-        }
+        """Get request headers with random user agent (a shared dict: copy before changing it)"""
+        return random.choice(self._header_variants)
 
     def extract_price(self, text: str) -> Optional[int]:
         """Extract price from text"""
-        if not text:
-            return None
-        text = text.replace(',', '').replace('₪', '').strip()
-        numbers = re.findall(r'\d+', text)
-        if numbers:
-            return int(max(numbers, key=int))
-        return None
+        return _extract_price(text)
 
-    def extract_data_updated_at_from_page(self, soup) -> List[int]:
+    def extract_data_updated_at_from_page(self, tree) -> List[int]:
         """Extract all dataUpdatedAt timestamps from page"""
         timestamps = []
         try:
-            scripts = soup.find_all('script')
-            for script in scripts:
-                if script.string:
-                    matches = re.findall(r'"dataUpdatedAt"\s*:\s*(\d{13})', script.string)
-                    for match in matches:
-                        timestamps.append(int(match))
+            for script in tree.iter('script'):
+                if script.text:
+                    timestamps.extend(int(m) for m in _DATA_UPDATED_AT_RE.findall(script.text))
         except Exception as e:
             logger.debug(f"Error extracting timestamps: {e}")
         return timestamps
 
-    def is_inside_yad1_listing(self, element) -> bool:
-        """Check if element is inside Yad1 (promoted) listing"""
-        parent = element.parent
-        while parent:
-            if parent.name == 'div' and parent.get('class'):
-                classes = parent.get('class')
-                if 'yad1-listing-data-content_yad1ListingDataContentBox__nWOxH' in classes:
-                    return True
-            parent = parent.parent
-        return False
-
-    def find_apartment_elements(self, soup) -> List:
-        """Find valid apartment elements"""
-        all_h2 = soup.find_all('h2', attrs={'data-nagish': 'content-section-title'})
-        valid = [h2 for h2 in all_h2 if not self.is_inside_yad1_listing(h2)]
-        return valid
+    def find_apartment_elements(self, tree) -> List:
+        """Find valid apartment elements (h2 titles outside Yad1 promoted listings)"""
+        return APARTMENT_H2_XPATH(tree)
 
     def get_apartment_container(self, h2_element):
         """Get the container element for an apartment"""
-        parent = h2_element.parent
-        depth = 0
-        while parent and depth < 10:
-            if parent.name in ['article', 'div']:
-                if parent.find('a', href=True):
-                    return parent
-            parent = parent.parent
-            depth += 1
-        return h2_element.parent if h2_element.parent else h2_element
-
-    def get_apartment_id(self, element) -> Optional[str]:
+        container = _first(CONTAINER_XPATH, h2_element)
+        if container is not None:
+            return container
+        parent = h2_element.getparent()
+        return parent if parent is not None else h2_element
+
+    def get_apartment_id(self, element, link=None) -> Optional[str]:
         """Extract apartment ID from element"""
-        link = element.find('a', href=True)
-        if link:
-            href = link['href']
-            m = re.search(r'/realestate/item/([A-Za-z0-9]+)', href)
-            if m:
-                return m.group(1)
+        if link is None:
+            link = _first(LINK_XPATH, element)
+        if link is not None:
+            apt_id = apartment_id_from_href(link.get('href'))
+            if apt_id:
+                return apt_id
         if element.get('data-id'):
             return element.get('data-id')
-        import hashlib
-        text_content = element.get_text(strip=True)
-        return hashlib.md5(text_content.encode()).hexdigest()[:12]
+        return hash_text(_text(element, strip=True))
 
     def parse_apartment(self, h2_element) -> Optional[Dict]:
         """Parse apartment data from HTML element"""
         try:
             container = self.get_apartment_container(h2_element)
-            apt_id = self.get_apartment_id(container)
+            found = _locate(container)
+            apt_id = self.get_apartment_id(container, found['link'])
 
             if not apt_id:
                 return None
 
-            title = h2_element.get_text(strip=True)
+            title = _text(h2_element, strip=True)
 
             # Extract price
             price = None
             price_text = None
-            price_elem = container.find('span', class_='feed-item-price_price__ygoeF')
-            if not price_elem:
-                price_elem = container.find('span', attrs={'data-testid': 'price'})
-            if price_elem:
-                price_text = price_elem.get_text(strip=True)
+            price_elem = found['price']
+            if price_elem is None:
+                price_elem = found['price_testid']
+            if price_elem is not None:
+                price_text = _text(price_elem, strip=True)
                 price = self.extract_price(price_text)
 
             if not price:
-                all_text = container.get_text()
+                all_text = _text(container)
                 price = self.extract_price(all_text)
 
             # Extract link
             link = None
-            link_elem = container.find('a', href=True)
-            if link_elem:
-                link = link_elem['href']
+            link_elem = found['link']
+            if link_elem is not None:
+                link = link_elem.get('href')
                 if not link.startswith('http'):
                     link = f"https://www.yad2.co.il{link}"
 
-            if not link or "/realestate/item/" not in link:
+            if not link or ITEM_PATH not in link:
                 return None
 
             # Extract address
             street_address = None
-            street_elem = container.find('span', class_='item-data-content_heading__tphH4')
-            if street_elem:
-                street_address = street_elem.get_text(strip=True)
+            street_elem = found['street']
+            if street_elem is not None:
+                street_address = _text(street_elem, strip=True)
 
             # Extract item info (rooms, sqm, floor)
             item_info = None
             rooms = None
             sqm = None
             floor = None
-            info_elem = container.find('span', class_='item-data-content_itemInfoLine__AeoPP')
-            if info_elem:
-                item_info = info_elem.get_text(strip=True)
-                # Try to parse rooms/sqm/floor
-                parts = item_info.split('·')
-                for part in parts:
-                    part = part.strip()
-                    if 'חדרים' in part or 'חדר' in part:
-                        nums = re.findall(r'[\d.]+', part)
-                        if nums:
-                            rooms = float(nums[0])
-                    elif 'מ"ר' in part or 'מטר' in part:
-                        nums = re.findall(r'\d+', part)
-                        if nums:
-                            sqm = int(nums[0])
-                    elif 'קומה' in part:
-                        nums = re.findall(r'\d+', part)
-                        if nums:
-                            floor = int(nums[0])
+            info_elem = found['info']
+            if info_elem is not None:
+                item_info = _text(info_elem, strip=True)
+                rooms, sqm, floor = parse_item_info(item_info)
 
             # Extract dataUpdatedAt
             data_updated_at = None
-            container_str = str(container)
-            match = re.search(r'"dataUpdatedAt"\s*:\s*(\d{13})', container_str)
-            if match:
-                data_updated_at = int(match.group(1))
+            for node in DATA_UPDATED_AT_XPATH(container):
+                text = node.text if isinstance(node, etree._Comment) else node
+                match = _DATA_UPDATED_AT_RE.search(text or '')
+                if match:
+                    data_updated_at = int(match.group(1))
+                    break
 
             # Extract image URL
             image_url = None
-            img_elem = container.find('img')
-            if img_elem:
+            img_elem = found['image']
+            if img_elem is not None:
                 image_url = img_elem.get('src') or img_elem.get('data-src')
 
             return {
@@ -416,68 +694,105 @@ class Yad2Monitor:
             logger.error(f"❌ Error parsing apartment: {e}", exc_info=True)
             return None
 
-    def fetch_page(self, url: str, page: int = 1, max_retries: int = 3) -> Optional[str]:
-        """Fetch a page with retry logic and proxy support"""
-        for attempt in range(max_retries):
-            try:
-                delay = self.delay_manager.get_page_delay() * (attempt + 1)
-                logger.info(f"⏳ Delay: {delay:.2f}s before page {page}")
-                time.sleep(delay)
+    @staticmethod
+    def _page_url(url: str, page: int) -> str:
+        """URL of a results page"""
+        if page > 1:
+            separator = '&' if '?' in url else '?'
+            return f"{url}{separator}page={page}"
+        return url
 
-                if page > 1:
-                    separator = '&' if '?' in url else '?'
-                    page_url = f"{url}{separator}page={page}"
-                else:
-                    page_url = url
+    def fetch_page(self, url: str, page: int = 1, max_retries: int = 3):
+        """Fetch and parse a page, backing off on rate limits and captcha blocks.
 
-                logger.info(f"🌐 Fetching page {page}")
+        Returns the parsed tree, NOT_MODIFIED if the cached listings are still current, or None.
+        """
+        for attempt in range(max_retries):
+            try:
+                # Sit out any shared pause before reserving a page token, so waiting
+                # workers do not all fire the moment it ends
+                self.delay_manager.wait_for_resume()
+                delay = self.delay_manager.get_page_delay()
+                if attempt:
+                    delay += self.delay_manager.get_retry_delay(attempt)
+                logger.debug("⏳ Delay: %.2fs before page %d", delay, page)
+                if self._stop.wait(delay):
+                    return None
+                self.delay_manager.wait_for_resume()
+                if self._stop.is_set():
+                    return None
+
+                page_url = self._page_url(url, page)
+                headers = self.get_headers()
+                # Revalidate only pages whose parsed listings we still hold
+                if page_url in self._page_apartments and self._page_validators.get(page_url):
+                    headers = {**headers, **self._page_validators[page_url]}
+
+                logger.debug("🌐 Fetching page %d", page)
 
                 # Use proxy if available
                 if self.proxy_manager.proxies:
                     response = self.proxy_rotator.make_request(
                         page_url,
-                        headers=self.get_headers(),
+                        headers=headers,
                         timeout=30
                     )
                 else:
-                    response = requests.get(
+                    response = self.session.get(
                         page_url,
-                        headers=self.get_headers(),
-                        timeout=30
+                        headers=headers,
+                        timeout=30,
+                        stream=True
                     )
 
                 if response is None:
                     continue
 
-                if response.status_code == 429:
-                    self.delay_manager.log_event("rate_limit", {"page": page})
-                    wait = 300 * (attempt + 1) * self.delay_manager.current_multiplier
+                if response.status_code != 200:
+                    # Release the streamed connection back to the pool
+                    response.close()
+
+                if response.status_code == 304:
+                    self.delay_manager.log_event("success", {"page": page, "not_modified": True})
+                    logger.info("♻️ Page %d not modified", page)
+                    return NOT_MODIFIED
+
+                if response.status_code in (403, 429):
+                    self.delay_manager.log_event("rate_limit", {"page": page, "status": response.status_code})
+                    wait = _retry_after(response)
+                    if wait is None:
+                        wait = 300 * (attempt + 1) * self.delay_manager.current_multiplier
                     logger.warning(f"⚠️ Rate limited! Waiting {wait // 60:.0f} minutes...")
-                    time.sleep(wait)
+                    # Pause the other fetch workers too, not just this one
+                    self.delay_manager.pause(wait)
                     continue
 
                 if response.status_code == 200:
-                    soup = BeautifulSoup(response.text, 'html.parser')
-                    block_header = soup.find('h1', class_='title')
+                    with response:
+                        tree, marker_seen = _parse_response(response)
 
-                    if block_header and "Are you for real" in block_header.get_text():
+                    # Only confirm against the page header when the byte scan hit
+                    block_header = _first(BLOCK_HEADER_XPATH, tree) if marker_seen else None
+                    if block_header is not None and "Are you for real" in _text(block_header):
                         self.delay_manager.log_event("block", {"page": page, "type": "captcha"})
                         delay_seconds = random.randint(120, 300) * (attempt + 1)
                         logger.warning(f"🚫 Blocked! Waiting {delay_seconds // 60:.0f} minutes...")
-                        time.sleep(delay_seconds)
+                        self.delay_manager.pause(delay_seconds)
                         continue
 
+                    self._page_validators[page_url] = _conditional_headers(response)
                     self.delay_manager.log_event("success", {"page": page})
-                    logger.info(f"✅ Page {page} fetched successfully")
-                    return response.text
+                    logger.info("✅ Page %d fetched successfully", page)
+                    return tree
 
                 elif response.status_code >= 500:
+                    # Transport already retried 5xx with backoff
                     self.delay_manager.log_event("error", {"page": page, "status": response.status_code})
-                    continue
+                    return None
 
             except requests.exceptions.Timeout:
                 self.delay_manager.log_event("timeout", {"page": page})
-                continue
+                return None
             except Exception as e:
                 self.delay_manager.log_event("error", {"page": page, "exception": str(e)})
                 if attempt < max_retries - 1:
@@ -486,74 +801,123 @@ class Yad2Monitor:
 
         return None
 
+    def _fetch_listings(self, base_url: str, page: int) -> Optional[List[Dict]]:
+        """Fetch a page and parse its listings; None when there is nothing (more) to scrape"""
+        tree = self.fetch_page(base_url, page)
+        if tree is None:
+            return None
+
+        page_url = self._page_url(base_url, page)
+        if tree is NOT_MODIFIED:
+            return [dict(apt) for apt in self._page_apartments[page_url]]
+
+        if page == 1:
+            total_pages = _total_pages(tree)
+            if total_pages:
+                self._total_pages[base_url] = total_pages
+            else:
+                self._total_pages.pop(base_url, None)
+
+        h2_elements = self.find_apartment_elements(tree)
+        if not h2_elements:
+            return None
+        apartments = [apt for apt in map(self.parse_apartment, h2_elements)
+                      if apt and apt['price'] and apt['link']]
+        self._page_apartments[page_url] = [dict(apt) for apt in apartments]
+        return apartments
+
+    def _fetch_pages(self, base_url: str, max_pages: int):
+        """Yield (page, apartments) in page order, keeping a window of pages fetching and parsing concurrently"""
+        # Page 1 alone: it often triggers the smart stop, and it tells how many pages exist
+        yield 1, self._fetch_listings(base_url, 1)
+
+        last_page = min(max_pages, self._total_pages.get(base_url, max_pages))
+        pages = iter(range(2, last_page + 1))
+        # Sliding window: each consumed page frees a slot for the next, so one slow page
+        # does not leave the other workers idle. Parsing runs on the workers too.
+        in_flight = deque((p, self._fetch_pool.submit(self._fetch_listings, base_url, p))
+                          for p in itertools.islice(pages, self._fetch_workers))
+        try:
+            while in_flight:
+                page, future = in_flight.popleft()
+                result = future.result()
+                # No listings means the end of results: stop widening the window
+                next_page = next(pages, None) if result is not None and not self._stop.is_set() else None
+                if next_page is not None:
+                    in_flight.append((next_page, self._fetch_pool.submit(self._fetch_listings, base_url, next_page)))
+                yield page, result
+        finally:
+            # Consumer stopped early: drop fetches not yet started
+            for _, future in in_flight:
+                future.cancel()
+
     def scrape_all_pages(self, base_url: str, max_pages: int = 50) -> Tuple[List[Dict], int]:
         """Scrape pages with smart stop based on consecutive known listings"""
         logger.info(f"🔍 Starting smart scrape from {base_url}")
 
         CONSECUTIVE_KNOWN_THRESHOLD = 4  # Stop after N consecutive known listings
 
-        current_run_ts = int(datetime.now().timestamp() * 1000)
+        current_run_ts = int(time.time() * 1000)
         all_apartments = []
         pages_saved = 0
-        page = 1
+        pages_scraped = 0
         consecutive_known = 0
 
         logger.info(f"📊 Stop strategy: Will stop after {CONSECUTIVE_KNOWN_THRESHOLD} consecutive known listings")
 
-        while page <= max_pages:
-            logger.info(f"{'=' * 50}")
-            logger.info(f"📄 Processing page {page} (consecutive known: {consecutive_known}/{CONSECUTIVE_KNOWN_THRESHOLD})")
+        for page, page_apartments in self._fetch_pages(base_url, max_pages):
+            logger.info("=" * 50)
+            logger.info("📄 Processing page %d (consecutive known: %d/%d)",
+                        page, consecutive_known, CONSECUTIVE_KNOWN_THRESHOLD)
 
-            html = self.fetch_page(base_url, page)
-            if not html:
-                break
+            if self._stop.is_set():
+                # Partial results would mark the unscraped listings as removed
+                logger.info("🛑 Stop requested; abandoning scrape")
+                return [], 0
 
-            soup = BeautifulSoup(html, 'html.parser')
-            h2_elements = self.find_apartment_elements(soup)
-            if not h2_elements:
+            if page_apartments is None:
                 break
 
             parsed_count = 0
             new_on_page = 0
             known_on_page = 0
 
-            for h2_elem in h2_elements:
-                apt = self.parse_apartment(h2_elem)
-                if apt and apt['price'] and apt['link']:
-                    all_apartments.append(apt)
-                    parsed_count += 1
-
-                    # Check if apartment already exists in database
-                    existing = self.db.get_apartment(apt['id'])
-                    if existing:
-                        # Known listing
-                        consecutive_known += 1
-                        known_on_page += 1
-
-                        # Check if we've hit the threshold
-                        if consecutive_known >= CONSECUTIVE_KNOWN_THRESHOLD:
-                            pages_saved = max_pages - page
-                            logger.info(f"🛑 Smart stop: {consecutive_known} consecutive known listings reached!")
-                            logger.info(f"💾 Saved approximately {pages_saved} page requests!")
-                            # Update last run timestamp before returning
-                            self.delay_manager.set_last_run_timestamp(current_run_ts)
-                            logger.info(f"{'=' * 50}")
-                            logger.info(f"✅ Scraping complete: {len(all_apartments)} apartments from {page} pages")
-                            logger.info(f"📊 Last page: {new_on_page} new, {known_on_page} known")
-                            return all_apartments, pages_saved
-                    else:
-                        # New listing - reset counter
-                        consecutive_known = 0
-                        new_on_page += 1
+            # Look up which of the page's listings are already stored in one query
+            known_ids = self.db.get_apartment_prices(apt['id'] for apt in page_apartments).keys()
+
+            for apt in page_apartments:
+                all_apartments.append(apt)
+                parsed_count += 1
+
+                if apt['id'] in known_ids:
+                    # Known listing
+                    consecutive_known += 1
+                    known_on_page += 1
+
+                    # Check if we've hit the threshold
+                    if consecutive_known >= CONSECUTIVE_KNOWN_THRESHOLD:
+                        pages_saved = max_pages - page
+                        logger.info(f"🛑 Smart stop: {consecutive_known} consecutive known listings reached!")
+                        logger.info(f"💾 Saved approximately {pages_saved} page requests!")
+                        # Update last run timestamp before returning
+                        self.delay_manager.set_last_run_timestamp(current_run_ts)
+                        logger.info(f"{'=' * 50}")
+                        logger.info(f"✅ Scraping complete: {len(all_apartments)} apartments from {page} pages")
+                        logger.info(f"📊 Last page: {new_on_page} new, {known_on_page} known")
+                        return all_apartments, pages_saved
+                else:
+                    # New listing - reset counter
+                    consecutive_known = 0
+                    new_on_page += 1
 
-            logger.info(f"✅ Page {page}: {parsed_count} apartments ({new_on_page} new, {known_on_page} known)")
-            page += 1
+            logger.info("✅ Page %d: %d apartments (%d new, %d known)", page, parsed_count, new_on_page, known_on_page)
+            pages_scraped = page
 
         # Update last run timestamp
         self.delay_manager.set_last_run_timestamp(current_run_ts)
 
         logger.info(f"{'=' * 50}")
-        logger.info(f"✅ Scraping complete: {len(all_apartments)} apartments from {page - 1} pages")
+        logger.info(f"✅ Scraping complete: {len(all_apartments)} apartments from {pages_scraped} pages")
         if pages_saved > 0:
             logger.info(f"💾 Pages saved: {pages_saved}")
 
@@ -561,50 +925,58 @@ class Yad2Monitor:
 
     def process_apartments(self, apartments: List[Dict]) -> Tuple[List[Dict], List[Dict], List[str]]:
         """Process apartments and detect changes"""
-        new_apartments = []
         price_changes = []
-        active_ids = set()
 
-        for apt in apartments:
-            apt_id = apt['id']
-            active_ids.add(apt_id)
+        # Diff the scraped batch against stored prices before saving it
+        seen = {apt['id']: apt for apt in apartments}
+        known_prices = self.db.get_apartment_prices(seen.keys())
+        new_ids = seen.keys() - known_prices.keys()
+        active_ids = set(seen)
 
-            # Save to database
-            _, is_new = self.db.upsert_apartment(apt)
+        new_apartments = [apt for apt_id, apt in seen.items() if apt_id in new_ids]
+        for apt in new_apartments:
+            logger.info("🆕 New: %s - %.40s", apt['id'], apt['title'])
 
-            if is_new:
-                new_apartments.append(apt)
-                logger.info(f"🆕 New: {apt_id} - {apt['title'][:40]}")
-            else:
-                # Check for price change
-                existing = self.db.get_apartment(apt_id)
-                if existing and existing.get('price') != apt.get('price'):
-                    old_price = existing['price']
-                    new_price = apt['price']
-                    if old_price and new_price:
-                        change = new_price - old_price
-                        change_pct = (change / old_price) * 100
-                        price_changes.append({
-                            'apartment': apt,
-                            'old_price': old_price,
-                            'new_price': new_price,
-                            'change': change,
-                            'change_pct': change_pct
-                        })
-                        logger.info(f"💰 Price change: {apt_id} ₪{old_price:,} → ₪{new_price:,}")
+        # Filter to repriced listings first; the loop below usually runs 0-2 times
+        repriced = {
+            apt_id: known_prices[apt_id]
+            for apt_id in seen.keys() & known_prices.keys()
+            if known_prices[apt_id] != seen[apt_id].get('price')
+        }
+        for apt_id, old_price in repriced.items():
+            apt = seen[apt_id]
+            new_price = apt['price']
+            if old_price and new_price:
+                change = new_price - old_price
+                change_pct = (change / old_price) * 100
+                price_changes.append({
+                    'apartment': apt,
+                    'old_price': old_price,
+                    'new_price': new_price,
+                    'change': change,
+                    'change_pct': change_pct
+                })
+                logger.info(f"💰 Price change: {apt_id} ₪{old_price:,} → ₪{new_price:,}")
+
+        # Save the whole batch in one transaction
+        self.db.upsert_apartments(list(seen.values()))
 
         # Mark inactive apartments
         removed = self.db.mark_apartments_inactive(active_ids)
 
-        # Update daily summary
-        price_drops = len([p for p in price_changes if p['change'] < 0])
-        price_increases = len([p for p in price_changes if p['change'] > 0])
-        self.db.update_daily_summary(
-            new_apts=len(new_apartments),
-            price_drops=price_drops,
-            price_increases=price_increases,
-            removed=len(removed)
-        )
+        # Idle cycles leave the cached insights and today's summary row alone
+        if new_apartments or price_changes or removed:
+            self.analytics.invalidate()
+
+            # Update daily summary
+            price_drops = len([p for p in price_changes if p['change'] < 0])
+            price_increases = len([p for p in price_changes if p['change'] > 0])
+            self.db.update_daily_summary(
+                new_apts=len(new_apartments),
+                price_drops=price_drops,
+                price_increases=price_increases,
+                removed=len(removed)
+            )
 
         logger.info(f"📊 Summary - New: {len(new_apartments)}, Price changes: {len(price_changes)}, Removed: {len(removed)}")
 
@@ -612,15 +984,29 @@ class Yad2Monitor:
 
     def send_notifications(self, new_apartments: List[Dict], price_changes: List[Dict]):
         """Send notifications for changes"""
-        for apt in new_apartments:
-            self.notifier.notify_new_apartment(apt)
+        self.notifier.notify_changes(new_apartments, price_changes)
+
+    def stop(self):
+        """Ask the monitor loop to exit after the current cycle"""
+        self._stop.set()
+
+    def close(self):
+        """Release pooled HTTP connections and worker threads"""
+        self._fetch_pool.shutdown(wait=False, cancel_futures=True)
+        self._notify_pool.shutdown(wait=True)
+        self.session.close()
+        self.proxy_rotator.session.close()
+        self.notifier.session.close()
+        if self.telegram_bot:
+            self.telegram_bot.session.close()
 
-        for change in price_changes:
-            self.notifier.notify_price_change(
-                change['apartment'],
-                change['old_price'],
-                change['new_price']
-            )
+    def _submit_notification(self, fn, *args):
+        """Queue notification work on the notification worker"""
+        def log_failure(future):
+            if future.exception() is not None:
+                logger.error(f"Notification task failed: {future.exception()}")
+
+        self._notify_pool.submit(fn, *args).add_done_callback(log_failure)
 
     def start_web_server(self, port: int = 5000):
         """Start web server in background thread"""
@@ -652,6 +1038,8 @@ class Yad2Monitor:
         all_changes = []
 
         for search in self.search_urls:
+            if self._stop.is_set():
+                break
             logger.info(f"📋 Scraping: {search['name']}")
             apartments, pages_saved = self.scrape_all_pages(search['url'])
 
@@ -660,14 +1048,15 @@ class Yad2Monitor:
                 all_new.extend(new_apts)
                 all_changes.extend(price_changes)
 
+                # Notify in the background while the next search URL is scraped
+                if new_apts or price_changes:
+                    self._submit_notification(self.send_notifications, new_apts, price_changes)
+
                 # Update search URL last scraped
                 self.db.update_search_url_scraped(search['id'])
 
-        if all_new or all_changes:
-            self.send_notifications(all_new, all_changes)
-
-        # Check for daily digest time
-        self.notifier.check_daily_digest_time()
+        # Check for daily digest time (queued after this cycle's notifications)
+        self._submit_notification(self.notifier.check_daily_digest_time)
 
         return len(all_new), len(all_changes)
 
@@ -695,20 +1084,19 @@ class Yad2Monitor:
         logger.info("=" * 80)
 
         # Start web server (Railway sets PORT automatically)
-        web_port = int(os.environ.get('PORT', os.environ.get('WEB_PORT', 5000)))
-        enable_web = os.environ.get('ENABLE_WEB', 'true').lower() == 'true'
-        if enable_web:
-            self.start_web_server(web_port)
+        if self.config.ENABLE_WEB:
+            self.start_web_server(self.config.WEB_PORT)
 
         # Send startup notification
         self.notifier.send_startup_message({
-            'min_interval': int(os.environ.get('MIN_INTERVAL_MINUTES', 60)),
-            'max_interval': int(os.environ.get('MAX_INTERVAL_MINUTES', 90))
+            'min_interval': self.config.MIN_INTERVAL_MINUTES,
+            'max_interval': self.config.MAX_INTERVAL_MINUTES
         })
 
         iteration = 0
+        consecutive_errors = 0
 
-        while True:
+        while not self._stop.is_set():
             try:
                 iteration += 1
                 logger.info("=" * 80)
@@ -716,8 +1104,12 @@ class Yad2Monitor:
                 logger.info("=" * 80)
 
                 new_count, change_count = self.run_once()
+                self.delay_manager.flush_events()
+                self.db.prune_scrape_logs(SCRAPE_LOG_RETENTION_DAYS)
+                LOG_FILE_BUFFER.flush()
 
                 logger.info(f"✅ Cycle complete - New: {new_count}, Changes: {change_count}")
+                consecutive_errors = 0
 
                 # Status report every 10 iterations
                 if iteration % 10 == 0:
@@ -730,32 +1122,39 @@ class Yad2Monitor:
                 logger.info(f"⏰ Next check: {next_check.strftime('%H:%M:%S')}")
                 logger.info(f"😴 Sleeping {interval // 60} minutes...")
 
-                time.sleep(interval)
+                self._stop.wait(interval)
 
             except KeyboardInterrupt:
-                logger.info("🛑 Stopping monitor...")
-                self.notifier.send_telegram_message("🛑 <b>Yad2 Monitor Stopped</b>")
-                break
+                self.stop()
             except Exception as e:
                 logger.error(f"❌ Error: {e}", exc_info=True)
                 self.delay_manager.log_event("error", {"type": "monitor_loop", "exception": str(e)})
-                self.notifier.send_error_alert(str(e), "Monitor loop")
-                time.sleep(300)
+                consecutive_errors += 1
+                if consecutive_errors in ERROR_ALERT_COUNTS:
+                    self.notifier.send_error_alert(str(e), f"Monitor loop (failure #{consecutive_errors})")
+
+                # Truncated exponential backoff with jitter, reset by the next good cycle
+                backoff = min(ERROR_BACKOFF_MAX, ERROR_BACKOFF_BASE * 1.5 ** (consecutive_errors - 1))
+                backoff *= random.uniform(0.8, 1.2)
+                logger.info(f"😴 Backing off {backoff / 60:.1f} minutes after {consecutive_errors} failed cycle(s)")
+                self._stop.wait(backoff)
+
+        logger.info("🛑 Stopping monitor...")
+        self.notifier.send_telegram_message("🛑 <b>Yad2 Monitor Stopped</b>")
+        self.close()
 
 
 def main():
     """Main entry point"""
     logger.info("🚀 Starting Yad2 Monitor - Enhanced Edition")
 
-    # Validate environment
-    if not os.environ.get("TELEGRAM_BOT_TOKEN"):
-        logger.error("❌ TELEGRAM_BOT_TOKEN required")
-        exit(1)
-    if not os.environ.get("TELEGRAM_CHAT_ID"):
-        logger.error("❌ TELEGRAM_CHAT_ID required")
-        exit(1)
+    # Validate environment once, up front (exits on missing or malformed settings)
+    config = validate_environment()
 
-    monitor = Yad2Monitor()
+    monitor = Yad2Monitor(config)
+    # Docker/Railway stop containers with SIGTERM: leave the loop and clean up instead of dying mid-sleep
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(sig, lambda signum, frame: monitor.stop())
     monitor.monitor()
 
 
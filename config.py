@@ -53,6 +53,7 @@ class Config:
     MAX_INTERVAL_MINUTES: int = 90
     HTTP_TIMEOUT_SECONDS: int = 15
     MAX_RETRIES: int = 3
+    PAGE_FETCH_WORKERS: int = 3
 
     # Server identification
     SERVER_NAME: Optional[str] = None
@@ -115,6 +116,7 @@ class Config:
             config.MAX_INTERVAL_MINUTES = cls._get_int_env('MAX_INTERVAL_MINUTES', cls.MAX_INTERVAL_MINUTES)
             config.HTTP_TIMEOUT_SECONDS = cls._get_int_env('HTTP_TIMEOUT_SECONDS', cls.HTTP_TIMEOUT_SECONDS)
             config.MAX_RETRIES = cls._get_int_env('MAX_RETRIES', cls.MAX_RETRIES)
+            config.PAGE_FETCH_WORKERS = cls._get_int_env('PAGE_FETCH_WORKERS', cls.PAGE_FETCH_WORKERS)
 
             # Validate integer ranges
             if not 1024 <= config.PORT <= 65535:
@@ -123,6 +125,9 @@ class Config:
             if not 1024 <= config.WEB_PORT <= 65535:
                 raise ConfigError(f"WEB_PORT must be between 1024 and 65535, got {config.WEB_PORT}")
 
+            if not 1 <= config.PAGE_FETCH_WORKERS <= 10:
+                raise ConfigError(f"PAGE_FETCH_WORKERS must be between 1 and 10, got {config.PAGE_FETCH_WORKERS}")
+
             if not 0 <= config.DAILY_DIGEST_HOUR <= 23:
                 raise ConfigError(f"DAILY_DIGEST_HOUR must be between 0 and 23, got {config.DAILY_DIGEST_HOUR}")
 
@@ -144,8 +149,8 @@ class Config:
             else:
                 config.ALLOWED_ORIGINS = ['*']
 
-            # Use PORT if WEB_PORT not explicitly set
-            if not os.getenv('WEB_PORT') and os.getenv('PORT'):
+            # Hosting platforms (Railway) assign PORT; it takes precedence over WEB_PORT
+            if os.getenv('PORT'):
                 config.WEB_PORT = config.PORT
 
             return config
@@ -274,6 +279,7 @@ class Config:
             f"Instant Notifications: {'Enabled' if self.INSTANT_NOTIFICATIONS else 'Disabled'}",
             f"Daily Digest: {'Enabled' if self.DAILY_DIGEST_ENABLED else 'Disabled'} (at {self.DAILY_DIGEST_HOUR}:00)",
             f"Scraping Interval: {self.MIN_INTERVAL_MINUTES}-{self.MAX_INTERVAL_MINUTES} minutes",
+            f"Page Fetch Workers: {self.PAGE_FETCH_WORKERS}",
             f"Server Name: {self.SERVER_NAME or 'Not set'}",
             "============================",
         ]
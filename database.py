@@ -3,7 +3,6 @@ SQLite Database Module for Yad2 Monitor
 Handles persistent storage for apartments, price history, settings, favorites
 """
 import sqlite3
-import json
 import os
 import threading
 from datetime import datetime, timedelta
@@ -11,13 +10,32 @@ from typing import Dict, List, Optional, Tuple
 from contextlib import contextmanager
 import logging
 
+import xxhash
+
+from json_utils import json_dumps
+
 logger = logging.getLogger(__name__)
 
+# Rows pulled per fetchmany() call when streaming large result sets
+FETCH_BATCH_SIZE = 10000
+
+# Scraped listing columns; a row whose values all match is only touched, not rewritten
+LISTING_FIELDS = ('title', 'price', 'price_text', 'location', 'street_address', 'item_info',
+                  'link', 'image_url', 'rooms', 'sqm', 'floor', 'neighborhood', 'city',
+                  'data_updated_at')
+
+
+def listing_fingerprint(apt: Dict) -> int:
+    """64-bit hash of an apartment's listing fields, for cheap unchanged checks"""
+    data = json_dumps([apt.get(field) for field in LISTING_FIELDS]).encode('utf-8')
+    return xxhash.xxh3_64_intdigest(data)
+
 
 class Database:
     def __init__(self, db_path: str = "yad2_monitor.db"):
         self.db_path = db_path
         self._local = threading.local()  # Thread-local storage for connections
+        self._fingerprints: Dict[str, int] = {}  # Listing fingerprint of each active row as last written
         self._init_wal_mode()
         self.init_database()
 
@@ -44,6 +62,9 @@ class Database:
             )
             self._local.conn.row_factory = sqlite3.Row
             self._local.conn.execute('PRAGMA busy_timeout=30000')
+            # In WAL mode NORMAL fsyncs only at checkpoints: commits stay atomic and
+            # crash-safe, and only a power loss can drop the last few transactions
+            self._local.conn.execute('PRAGMA synchronous=NORMAL')
 
         conn = self._local.conn
         try:
@@ -185,6 +206,17 @@ class Database:
                 )
             ''')
 
+            # Per-day price rollup used by trend analytics
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS daily_price_summary (
+                    date TEXT NOT NULL,
+                    neighborhood TEXT,
+                    city TEXT,
+                    avg_price REAL,
+                    sample_count INTEGER
+                )
+            ''')
+
             # Notifications queue
             cursor.execute('''
                 CREATE TABLE IF NOT EXISTS notification_queue (
@@ -273,15 +305,29 @@ class Database:
             cursor.execute('CREATE INDEX IF NOT EXISTS idx_apartments_price ON apartments(price)')
             cursor.execute('CREATE INDEX IF NOT EXISTS idx_apartments_location ON apartments(location)')
             cursor.execute('CREATE INDEX IF NOT EXISTS idx_apartments_last_seen ON apartments(last_seen)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_price_history_apt ON price_history(apartment_id)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_price_history_date ON price_history(recorded_at)')
+            # (apartment_id, recorded_at) serves the capped newest-first history read without a sort
+            cursor.execute('DROP INDEX IF EXISTS idx_price_history_apt')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_price_history_apt_recorded ON price_history(apartment_id, recorded_at)')
+            # idx_ph_recorded below leads with recorded_at and covers date-range reads
+            cursor.execute('DROP INDEX IF EXISTS idx_price_history_date')
             cursor.execute('CREATE INDEX IF NOT EXISTS idx_scrape_logs_type ON scrape_logs(event_type)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_scrape_logs_created ON scrape_logs(created_at)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_daily_price_summary_date ON daily_price_summary(date, neighborhood)')
             cursor.execute('CREATE INDEX IF NOT EXISTS idx_user_favorites_chat ON user_favorites(chat_id)')
             cursor.execute('CREATE INDEX IF NOT EXISTS idx_user_favorites_apt ON user_favorites(apartment_id)')
             cursor.execute('CREATE INDEX IF NOT EXISTS idx_user_ignored_chat ON user_ignored(chat_id)')
             cursor.execute('CREATE INDEX IF NOT EXISTS idx_user_filters_chat ON user_filters(chat_id)')
             cursor.execute('CREATE INDEX IF NOT EXISTS idx_telegram_users_active ON telegram_users(is_active)')
 
+            # Covering/partial indexes for the analytics hot paths
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_ph_recorded ON price_history(recorded_at, apartment_id, price)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_apt_active_nbhd ON apartments(is_active, neighborhood) WHERE is_active = 1')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_apt_firstseen ON apartments(first_seen) WHERE is_active = 1')
+
+            # Let SQLite refresh planner statistics only for tables that need it
+            # (0x10000: consider every table, as this connection has run no queries yet)
+            cursor.execute('PRAGMA optimize=0x10002')
+
             logger.info(f"Database initialized at {self.db_path}")
 
             # Migrate data from old favorites table to new user_favorites table
@@ -567,60 +613,92 @@ class Database:
 
     def upsert_apartment(self, apt: Dict) -> Tuple[str, bool]:
         """Insert or update apartment. Returns (apt_id, is_new)"""
+        self._fingerprints.pop(apt['id'], None)
         with self.get_connection() as conn:
-            cursor = conn.cursor()
-
-            # Check if exists
-            cursor.execute('SELECT id, price FROM apartments WHERE id = ?', (apt['id'],))
-            existing = cursor.fetchone()
+            return apt['id'], self._upsert_apartment(conn.cursor(), apt)
 
-            is_new = existing is None
-            price_changed = False
+    def upsert_apartments(self, apartments: List[Dict]) -> List[Tuple[str, bool]]:
+        """Insert or update a batch of apartments in a single transaction"""
+        results = []
+        unchanged = []
+        written = {}
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            for apt in apartments:
+                fingerprint = listing_fingerprint(apt)
+                if self._fingerprints.get(apt['id']) == fingerprint:
+                    unchanged.append(apt['id'])
+                    results.append((apt['id'], False))
+                    continue
+                results.append((apt['id'], self._upsert_apartment(cursor, apt)))
+                written[apt['id']] = fingerprint
+
+            if unchanged:
+                # Same listing as last written: only record that they were seen
+                placeholders = ','.join('?' * len(unchanged))
+                cursor.execute(f'UPDATE apartments SET last_seen = ? WHERE id IN ({placeholders})',
+                               [datetime.now().isoformat(), *unchanged])
+
+        self._fingerprints.update(written)
+        return results
+
+    def _upsert_apartment(self, cursor, apt: Dict) -> bool:
+        """Upsert one apartment on an open cursor. Returns is_new"""
+        # Check if exists
+        cursor.execute(f"SELECT {', '.join(LISTING_FIELDS)}, is_active FROM apartments WHERE id = ?",
+                       (apt['id'],))
+        existing = cursor.fetchone()
+
+        is_new = existing is None
+        if not is_new and existing['is_active'] and all(existing[f] == apt.get(f) for f in LISTING_FIELDS):
+            # Unchanged listing: only record that it was seen
+            cursor.execute('UPDATE apartments SET last_seen = ? WHERE id = ?',
+                           (datetime.now().isoformat(), apt['id']))
+            return False
 
-            if existing and existing['price'] != apt.get('price'):
-                price_changed = True
+        price_changed = not is_new and existing['price'] != apt.get('price')
+
+        cursor.execute('''
+            INSERT INTO apartments (id, title, price, price_text, location, street_address,
+                item_info, link, image_url, rooms, sqm, floor, neighborhood, city,
+                data_updated_at, last_seen, is_active, raw_data)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 1, ?)
+            ON CONFLICT(id) DO UPDATE SET
+                title = excluded.title,
+                price = excluded.price,
+                price_text = excluded.price_text,
+                location = excluded.location,
+                street_address = excluded.street_address,
+                item_info = excluded.item_info,
+                link = excluded.link,
+                image_url = excluded.image_url,
+                rooms = excluded.rooms,
+                sqm = excluded.sqm,
+                floor = excluded.floor,
+                neighborhood = excluded.neighborhood,
+                city = excluded.city,
+                data_updated_at = excluded.data_updated_at,
+                last_seen = excluded.last_seen,
+                is_active = 1,
+                raw_data = excluded.raw_data
+        ''', (
+            apt['id'], apt.get('title'), apt.get('price'), apt.get('price_text'),
+            apt.get('location'), apt.get('street_address'), apt.get('item_info'),
+            apt.get('link'), apt.get('image_url'), apt.get('rooms'), apt.get('sqm'),
+            apt.get('floor'), apt.get('neighborhood'), apt.get('city'),
+            apt.get('data_updated_at'), datetime.now().isoformat(),
+            json_dumps(apt)
+        ))
+
+        # Record price if changed or new (inline to avoid nested connection)
+        if is_new or price_changed:
+            if apt.get('price'):
+                cursor.execute(
+                    'INSERT INTO price_history (apartment_id, price) VALUES (?, ?)',
+                    (apt['id'], apt['price'])
+                )
 
-            cursor.execute('''
-                INSERT INTO apartments (id, title, price, price_text, location, street_address,
-                    item_info, link, image_url, rooms, sqm, floor, neighborhood, city,
-                    data_updated_at, last_seen, is_active, raw_data)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 1, ?)
-                ON CONFLICT(id) DO UPDATE SET
-                    title = excluded.title,
-                    price = excluded.price,
-                    price_text = excluded.price_text,
-                    location = excluded.location,
-                    street_address = excluded.street_address,
-                    item_info = excluded.item_info,
-                    link = excluded.link,
-                    image_url = excluded.image_url,
-                    rooms = excluded.rooms,
-                    sqm = excluded.sqm,
-                    floor = excluded.floor,
-                    neighborhood = excluded.neighborhood,
-                    city = excluded.city,
-                    data_updated_at = excluded.data_updated_at,
-                    last_seen = excluded.last_seen,
-                    is_active = 1,
-                    raw_data = excluded.raw_data
-            ''', (
-                apt['id'], apt.get('title'), apt.get('price'), apt.get('price_text'),
-                apt.get('location'), apt.get('street_address'), apt.get('item_info'),
-                apt.get('link'), apt.get('image_url'), apt.get('rooms'), apt.get('sqm'),
-                apt.get('floor'), apt.get('neighborhood'), apt.get('city'),
-                apt.get('data_updated_at'), datetime.now().isoformat(),
-                json.dumps(apt, ensure_ascii=False)
-            ))
-
-            # Record price if changed or new (inline to avoid nested connection)
-            if is_new or price_changed:
-                if apt.get('price'):
-                    cursor.execute(
-                        'INSERT INTO price_history (apartment_id, price) VALUES (?, ?)',
-                        (apt['id'], apt['price'])
-                    )
-
-            return apt['id'], is_new
+        return is_new
 
     def get_apartment(self, apt_id: str) -> Optional[Dict]:
         """Get single apartment by ID"""
@@ -630,6 +708,17 @@ class Database:
             row = cursor.fetchone()
             return dict(row) if row else None
 
+    def get_apartment_prices(self, apt_ids) -> Dict[str, Optional[int]]:
+        """Get current price for each of the given IDs that already exists"""
+        apt_ids = list(apt_ids)
+        if not apt_ids:
+            return {}
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            placeholders = ','.join('?' * len(apt_ids))
+            cursor.execute(f'SELECT id, price FROM apartments WHERE id IN ({placeholders})', apt_ids)
+            return {row['id']: row['price'] for row in cursor.fetchall()}
+
     def get_all_apartments(self, active_only: bool = True) -> List[Dict]:
         """Get all apartments"""
         with self.get_connection() as conn:
@@ -684,19 +773,17 @@ class Database:
         with self.get_connection() as conn:
             cursor = conn.cursor()
 
-            # Get current active apartments
-            cursor.execute('SELECT id FROM apartments WHERE is_active = 1')
-            all_active = {row['id'] for row in cursor.fetchall()}
-
-            # Mark missing ones as inactive
-            to_deactivate = all_active - active_ids
+            # Deactivate missing ones in one statement; the diff runs inside SQLite
+            placeholders = ','.join('?' * len(active_ids))
+            cursor.execute(f'UPDATE apartments SET is_active = 0 WHERE is_active = 1 '
+                           f'AND id NOT IN ({placeholders}) RETURNING id', list(active_ids))
+            to_deactivate = [row['id'] for row in cursor.fetchall()]
             if to_deactivate:
-                placeholders = ','.join('?' * len(to_deactivate))
-                cursor.execute(f'UPDATE apartments SET is_active = 0 WHERE id IN ({placeholders})',
-                              list(to_deactivate))
                 logger.info(f"Marked {len(to_deactivate)} apartments as inactive")
+                for apt_id in to_deactivate:
+                    self._fingerprints.pop(apt_id, None)
 
-            return list(to_deactivate)
+            return to_deactivate
 
     # ============ Price History Methods ============
 
@@ -745,6 +832,24 @@ class Database:
             ''', (cutoff,))
             return [dict(row) for row in cursor.fetchall()]
 
+    def refresh_daily_price_summary(self):
+        """Recompute the daily price rollup from the latest summarized day onward"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT MAX(date) FROM daily_price_summary')
+            since = cursor.fetchone()[0] or ''
+
+            cursor.execute('DELETE FROM daily_price_summary WHERE date >= ?', (since,))
+            cursor.execute('''
+                INSERT INTO daily_price_summary (date, neighborhood, city, avg_price, sample_count)
+                SELECT substr(ph.recorded_at, 1, 10), a.neighborhood, a.city,
+                       AVG(ph.price), COUNT(*)
+                FROM price_history ph
+                JOIN apartments a ON ph.apartment_id = a.id
+                WHERE ph.recorded_at >= ?
+                GROUP BY 1, 2, 3
+            ''', (since,))
+
     # ============ Favorites & Ignored ============
 
     def add_favorite(self, apt_id: str, notes: str = None):
@@ -901,7 +1006,35 @@ class Database:
             cursor = conn.cursor()
             cursor.execute(
                 'INSERT INTO scrape_logs (event_type, details) VALUES (?, ?)',
-                (event_type, json.dumps(details) if details else None)
+                (event_type, json_dumps(details) if details else None)
+            )
+
+    def get_scrape_event_times(self, hours: int = 24) -> List[Tuple[float, str]]:
+        """(epoch seconds, event_type) of scrape events in the last N hours"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT CAST(strftime('%s', created_at) AS INTEGER), event_type
+                FROM scrape_logs
+                WHERE created_at >= datetime('now', ?)
+            ''', (f'-{hours} hours',))
+            return [tuple(row) for row in cursor.fetchall()]
+
+    def prune_scrape_logs(self, days: int) -> int:
+        """Delete scrape events older than the given number of days"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM scrape_logs WHERE created_at < datetime('now', ?)", (f'-{days} days',))
+            return cursor.rowcount
+
+    def log_scrape_events(self, events: List[Tuple[str, Optional[Dict], str]]):
+        """Log a batch of (event_type, details, created_at) scrape events"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.executemany(
+                'INSERT INTO scrape_logs (event_type, details, created_at) VALUES (?, ?, ?)',
+                [(event_type, json_dumps(details) if details else None, created_at)
+                 for event_type, details, created_at in events]
             )
 
     def get_scrape_stats(self, hours: int = 24) -> Dict:
@@ -998,13 +1131,14 @@ class Database:
                     ORDER BY ph.apartment_id, ph.recorded_at
                 ''')
 
-            rows = cursor.fetchall()
-
             with open(filepath, 'w', newline='', encoding='utf-8') as f:
                 writer = csv.writer(f)
                 writer.writerow(['title', 'apartment_id', 'price', 'recorded_at'])
-                for row in rows:
-                    writer.writerow(row)
+                while True:
+                    rows = cursor.fetchmany(FETCH_BATCH_SIZE)
+                    if not rows:
+                        break
+                    writer.writerows(rows)
 
         return True
 
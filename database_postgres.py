@@ -4,13 +4,15 @@ Compatible with the SQLite Database interface
 """
 import psycopg2
 import psycopg2.extras
-import json
 import os
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Tuple
 from contextlib import contextmanager
 import logging
 
+from database import LISTING_FIELDS, listing_fingerprint
+from json_utils import json_dumps
+
 logger = logging.getLogger(__name__)
 
 
@@ -19,6 +21,7 @@ class PostgreSQLDatabase:
 
     def __init__(self, database_url: str):
         self.database_url = database_url
+        self._fingerprints: Dict[str, int] = {}  # Listing fingerprint of each active row as last written
         logger.info(f"🐘 Initializing PostgreSQL database")
         self.init_database()
 
@@ -242,9 +245,12 @@ class PostgreSQLDatabase:
             cursor.execute('CREATE INDEX IF NOT EXISTS idx_apartments_price ON apartments(price)')
             cursor.execute('CREATE INDEX IF NOT EXISTS idx_apartments_location ON apartments(location)')
             cursor.execute('CREATE INDEX IF NOT EXISTS idx_apartments_last_seen ON apartments(last_seen)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_price_history_apt ON price_history(apartment_id)')
+            # (apartment_id, recorded_at) serves the capped newest-first history read without a sort
+            cursor.execute('DROP INDEX IF EXISTS idx_price_history_apt')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_price_history_apt_recorded ON price_history(apartment_id, recorded_at)')
             cursor.execute('CREATE INDEX IF NOT EXISTS idx_price_history_date ON price_history(recorded_at)')
             cursor.execute('CREATE INDEX IF NOT EXISTS idx_scrape_logs_type ON scrape_logs(event_type)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_scrape_logs_created ON scrape_logs(created_at)')
             cursor.execute('CREATE INDEX IF NOT EXISTS idx_user_favorites_chat ON user_favorites(chat_id)')
             cursor.execute('CREATE INDEX IF NOT EXISTS idx_user_favorites_apt ON user_favorites(apartment_id)')
             cursor.execute('CREATE INDEX IF NOT EXISTS idx_user_ignored_chat ON user_ignored(chat_id)')
@@ -258,48 +264,83 @@ class PostgreSQLDatabase:
 
     def upsert_apartment(self, apartment: Dict) -> Tuple[bool, bool]:
         """Insert or update apartment - returns (updated, is_new)"""
+        self._fingerprints.pop(apartment['id'], None)
         with self.get_connection() as conn:
-            cursor = conn.cursor()
+            return (True, self._upsert_apartment(conn.cursor(), apartment))
 
-            # Check if exists
-            cursor.execute('SELECT id, price FROM apartments WHERE id = %s', (apartment['id'],))
-            existing = cursor.fetchone()
+    def upsert_apartments(self, apartments: List[Dict]) -> List[Tuple[str, bool]]:
+        """Insert or update a batch of apartments in a single transaction"""
+        results = []
+        unchanged = []
+        written = {}
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            for apartment in apartments:
+                fingerprint = listing_fingerprint(apartment)
+                if self._fingerprints.get(apartment['id']) == fingerprint:
+                    unchanged.append(apartment['id'])
+                    results.append((apartment['id'], False))
+                    continue
+                results.append((apartment['id'], self._upsert_apartment(cursor, apartment)))
+                written[apartment['id']] = fingerprint
+
+            if unchanged:
+                # Same listing as last written: only record that they were seen
+                cursor.execute('UPDATE apartments SET last_seen = CURRENT_TIMESTAMP WHERE id = ANY(%s)',
+                               (unchanged,))
+
+        self._fingerprints.update(written)
+        return results
+
+    def _upsert_apartment(self, cursor, apartment: Dict) -> bool:
+        """Upsert one apartment on an open cursor - returns is_new"""
+        # Check if exists
+        cursor.execute(f"SELECT {', '.join(LISTING_FIELDS)}, is_active FROM apartments WHERE id = %s",
+                       (apartment['id'],))
+        existing = cursor.fetchone()
+
+        if existing and existing[-1] and all(
+                value == apartment.get(field) for field, value in zip(LISTING_FIELDS, existing)):
+            # Unchanged listing: only record that it was seen
+            cursor.execute('UPDATE apartments SET last_seen = CURRENT_TIMESTAMP WHERE id = %s',
+                           (apartment['id'],))
+            return False
 
-            if existing:
-                # Update existing
-                cursor.execute('''
-                    UPDATE apartments SET
-                        title = %s, price = %s, price_text = %s, location = %s,
-                        street_address = %s, item_info = %s, link = %s, image_url = %s,
-                        rooms = %s, sqm = %s, floor = %s, neighborhood = %s, city = %s,
-                        data_updated_at = %s, last_seen = CURRENT_TIMESTAMP, is_active = 1,
-                        raw_data = %s
-                    WHERE id = %s
-                ''', (
-                    apartment.get('title'), apartment.get('price'), apartment.get('price_text'),
-                    apartment.get('location'), apartment.get('street_address'), apartment.get('item_info'),
-                    apartment.get('link'), apartment.get('image_url'), apartment.get('rooms'),
-                    apartment.get('sqm'), apartment.get('floor'), apartment.get('neighborhood'),
-                    apartment.get('city'), apartment.get('data_updated_at'),
-                    json.dumps(apartment, ensure_ascii=False), apartment['id']
-                ))
-                return (True, False)
-            else:
-                # Insert new
-                cursor.execute('''
-                    INSERT INTO apartments (id, title, price, price_text, location, street_address,
-                        item_info, link, image_url, rooms, sqm, floor, neighborhood, city,
-                        data_updated_at, last_seen, is_active, raw_data)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, CURRENT_TIMESTAMP, 1, %s)
-                ''', (
-                    apartment['id'], apartment.get('title'), apartment.get('price'),
-                    apartment.get('price_text'), apartment.get('location'), apartment.get('street_address'),
-                    apartment.get('item_info'), apartment.get('link'), apartment.get('image_url'),
-                    apartment.get('rooms'), apartment.get('sqm'), apartment.get('floor'),
-                    apartment.get('neighborhood'), apartment.get('city'), apartment.get('data_updated_at'),
-                    json.dumps(apartment, ensure_ascii=False)
-                ))
-                return (True, True)
+        if existing:
+            # Update existing
+            cursor.execute('''
+                UPDATE apartments SET
+                    title = %s, price = %s, price_text = %s, location = %s,
+                    street_address = %s, item_info = %s, link = %s, image_url = %s,
+                    rooms = %s, sqm = %s, floor = %s, neighborhood = %s, city = %s,
+                    data_updated_at = %s, last_seen = CURRENT_TIMESTAMP, is_active = 1,
+                    raw_data = %s
+                WHERE id = %s
+            ''', (
+                apartment.get('title'), apartment.get('price'), apartment.get('price_text'),
+                apartment.get('location'), apartment.get('street_address'), apartment.get('item_info'),
+                apartment.get('link'), apartment.get('image_url'), apartment.get('rooms'),
+                apartment.get('sqm'), apartment.get('floor'), apartment.get('neighborhood'),
+                apartment.get('city'), apartment.get('data_updated_at'),
+                json_dumps(apartment), apartment['id']
+            ))
+            return False
+        else:
+            # Insert new
+            cursor.execute('''
+                INSERT INTO apartments (id, title, price, price_text, location, street_address,
+                    item_info, link, image_url, rooms, sqm, floor, neighborhood, city,
+                    data_updated_at, last_seen, is_active, raw_data)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, CURRENT_TIMESTAMP, 1, %s)
+            ''', (
+                apartment['id'], apartment.get('title'), apartment.get('price'),
+                apartment.get('price_text'), apartment.get('location'), apartment.get('street_address'),
+                apartment.get('item_info'), apartment.get('link'), apartment.get('image_url'),
+                apartment.get('rooms'), apartment.get('sqm'), apartment.get('floor'),
+                apartment.get('neighborhood'), apartment.get('city'), apartment.get('data_updated_at'),
+                json_dumps(apartment)
+            ))
+            return True
 
     def get_apartment(self, apartment_id: str) -> Optional[Dict]:
         """Get apartment by ID"""
@@ -309,6 +350,16 @@ class PostgreSQLDatabase:
             row = cursor.fetchone()
             return dict(row) if row else None
 
+    def get_apartment_prices(self, apartment_ids) -> Dict[str, Optional[int]]:
+        """Get current price for each of the given IDs that already exists"""
+        apartment_ids = list(apartment_ids)
+        if not apartment_ids:
+            return {}
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT id, price FROM apartments WHERE id = ANY(%s)', (apartment_ids,))
+            return {row[0]: row[1] for row in cursor.fetchall()}
+
     def get_all_apartments(self, active_only: bool = True) -> List[Dict]:
         """Get all apartments"""
         with self.get_connection() as conn:
@@ -378,7 +429,37 @@ class PostgreSQLDatabase:
             cursor.execute('''
                 INSERT INTO scrape_logs (event_type, details)
                 VALUES (%s, %s)
-            ''', (event_type, json.dumps(details) if details else None))
+            ''', (event_type, json_dumps(details) if details else None))
+
+    def get_scrape_event_times(self, hours: int = 24) -> List[Tuple[float, str]]:
+        """(epoch seconds, event_type) of scrape events in the last N hours"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT EXTRACT(EPOCH FROM created_at)::float8, event_type
+                FROM scrape_logs
+                WHERE created_at >= CURRENT_TIMESTAMP - make_interval(hours => %s)
+            ''', (hours,))
+            return cursor.fetchall()
+
+    def prune_scrape_logs(self, days: int) -> int:
+        """Delete scrape events older than the given number of days"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('DELETE FROM scrape_logs WHERE created_at < CURRENT_TIMESTAMP - make_interval(days => %s)',
+                           (days,))
+            return cursor.rowcount
+
+    def log_scrape_events(self, events: List[Tuple[str, Optional[Dict], str]]):
+        """Log a batch of (event_type, details, created_at) scrape events"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            psycopg2.extras.execute_values(
+                cursor,
+                'INSERT INTO scrape_logs (event_type, details, created_at) VALUES %s',
+                [(event_type, json_dumps(details) if details else None, created_at)
+                 for event_type, details, created_at in events]
+            )
 
     def get_daily_summary(self, date: str = None) -> Optional[Dict]:
         """Get summary for a specific date"""
@@ -675,20 +756,18 @@ class PostgreSQLDatabase:
         with self.get_connection() as conn:
             cursor = conn.cursor()
 
-            # Get current active apartments
-            cursor.execute('SELECT id FROM apartments WHERE is_active = 1')
-            all_active = {row[0] for row in cursor.fetchall()}
-
-            # Mark missing ones as inactive
-            to_deactivate = all_active - active_ids
+            # Deactivate missing ones in one statement; the diff runs in the database
+            cursor.execute(
+                'UPDATE apartments SET is_active = 0 WHERE is_active = 1 AND NOT (id = ANY(%s)) RETURNING id',
+                (list(active_ids),)
+            )
+            to_deactivate = [row[0] for row in cursor.fetchall()]
             if to_deactivate:
-                cursor.execute(
-                    'UPDATE apartments SET is_active = 0 WHERE id = ANY(%s)',
-                    (list(to_deactivate),)
-                )
                 logger.info(f"Marked {len(to_deactivate)} apartments as inactive")
+                for apt_id in to_deactivate:
+                    self._fingerprints.pop(apt_id, None)
 
-            return list(to_deactivate)
+            return to_deactivate
 
     # ============ Daily Summary Methods ============
 
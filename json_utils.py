@@ -0,0 +1,25 @@
+"""
+JSON helpers for Yad2 Monitor
+orjson-backed serialization shared by the database, Telegram, proxy and web modules
+"""
+from typing import Any, Callable, Optional
+
+import orjson
+
+# API responses: allow int dict keys and let the caller's default format dates
+API_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+
+def json_bytes(obj: Any, default: Optional[Callable[[Any], Any]] = None, option: Optional[int] = None) -> bytes:
+    """Serialize to compact UTF-8 JSON bytes"""
+    return orjson.dumps(obj, default=default, option=option)
+
+
+def json_dumps(obj: Any, default: Optional[Callable[[Any], Any]] = None, option: Optional[int] = None) -> str:
+    """Serialize to a compact JSON string"""
+    return orjson.dumps(obj, default=default, option=option).decode('utf-8')
+
+
+def json_loads(data) -> Any:
+    """Parse JSON from bytes or str"""
+    return orjson.loads(data)
@@ -3,17 +3,71 @@ Notifications Module for Yad2 Monitor
 Handles Telegram notifications with filters, summaries, and rich messages
 """
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import time
 import os
-import json
 import threading
 from datetime import datetime, timedelta
+from functools import lru_cache
 from typing import Dict, List, Optional, Callable
-from concurrent.futures import ThreadPoolExecutor
 import logging
 
+from json_utils import json_dumps
+
 logger = logging.getLogger(__name__)
 
+SEPARATOR = "─" * 30
+
+# Telegram caps messages at 4096 chars; leave headroom for HTML entities
+TELEGRAM_PACK_LIMIT = 3800
+PACK_SEPARATOR = f"\n\n{SEPARATOR}\n\n"
+
+
+@lru_cache(maxsize=1)
+def _minute_stamp(minute: int) -> str:
+    """'%d/%m/%Y %H:%M' for a minute since the epoch, formatted once per minute"""
+    return datetime.fromtimestamp(minute * 60).strftime('%d/%m/%Y %H:%M')
+
+
+def _now_stamp() -> str:
+    """Current local time as shown in notification footers"""
+    return _minute_stamp(int(time.time() // 60))
+
+
+# Message templates, filled with a single %-format per notification
+_TPL_NEW = (
+    "🆕 <b>דירה חדשה!</b>\n"
+    f"{SEPARATOR}\n\n"
+    "<b>📍 %(title)s</b>\n\n"
+    "🏠 <b>כתובת:</b> %(address)s\n"
+    "%(info_line)s"
+    "\n💰 <b>מחיר:</b> %(price)s"
+    "%(price_per_sqm)s"
+    "%(floor)s\n"
+    "📅 <b>תאריך:</b> %(timestamp)s\n\n"
+    "🔗 <a href='%(link)s'>לצפייה בדירה</a>"
+    "%(signature)s"
+)
+_TPL_PRICE_CHANGE = (
+    "%(emoji)s <b>%(change_text)s</b>\n"
+    f"{SEPARATOR}\n\n"
+    "<b>📍 %(title)s</b>\n\n"
+    "💵 <b>מחיר קודם:</b> ₪%(old_price)s\n"
+    "💰 <b>מחיר חדש:</b> ₪%(new_price)s\n"
+    "%(change_emoji)s <b>שינוי:</b> ₪%(change)s (%(change_pct)s%%)"
+    "%(recommendation)s\n\n"
+    "🔗 <a href='%(link)s'>לצפייה בדירה</a>"
+    "%(signature)s"
+)
+_TPL_REMOVED = (
+    "🗑️ <b>דירה הוסרה</b>\n"
+    f"{SEPARATOR}\n\n"
+    "<b>📍 %(title)s</b>\n"
+    "💰 <b>מחיר אחרון:</b> ₪%(price)s\n"
+    "📅 <b>ימים בשוק:</b> %(days)s\n"
+)
+
 
 class NotificationManager:
     """Manages notifications across multiple channels"""
@@ -22,6 +76,14 @@ class NotificationManager:
         self.db = database
         self.telegram_bot = telegram_bot
 
+        # Reused Telegram connection; GET 5xx retried by urllib3, 429 (even with Retry-After)
+        # returned to the sender. POSTs are not resent: Telegram may already have delivered them.
+        retry = Retry(total=3, backoff_factor=1, status_forcelist=(500, 502, 503, 504),
+                      allowed_methods=frozenset(['GET']), raise_on_status=False,
+                      respect_retry_after_header=False)
+        self.session = requests.Session()
+        self.session.mount('https://', HTTPAdapter(pool_maxsize=8, max_retries=retry))
+
         # Fallback for legacy single-user support
         self.telegram_token = os.environ.get('TELEGRAM_BOT_TOKEN')
         self.telegram_chat_id = os.environ.get('TELEGRAM_CHAT_ID')
@@ -90,23 +152,17 @@ class NotificationManager:
         item_info = apt.get('item_info', '')
         info_line = f"\n📋 {item_info}" if item_info else ""
 
-        timestamp = datetime.now().strftime('%d/%m/%Y %H:%M')
-
-        message = (
-            f"🆕 <b>דירה חדשה!</b>\n"
-            f"{'─' * 30}\n\n"
-            f"<b>📍 {apt.get('title', 'ללא כותרת')}</b>\n\n"
-            f"🏠 <b>כתובת:</b> {apt.get('street_address') or apt.get('location') or 'לא צוין'}\n"
-            f"{info_line}"
-            f"\n💰 <b>מחיר:</b> {price_str}"
-            f"{price_per_sqm}"
-            f"{floor_str}\n"
-            f"📅 <b>תאריך:</b> {timestamp}\n\n"
-            f"🔗 <a href='{apt.get('link', '')}'>לצפייה בדירה</a>"
-            f"{self.get_server_signature()}"
-        )
-
-        return message
+        return _TPL_NEW % {
+            'title': apt.get('title', 'ללא כותרת'),
+            'address': apt.get('street_address') or apt.get('location') or 'לא צוין',
+            'info_line': info_line,
+            'price': price_str,
+            'price_per_sqm': price_per_sqm,
+            'floor': floor_str,
+            'timestamp': _now_stamp(),
+            'link': apt.get('link', ''),
+            'signature': self.get_server_signature(),
+        }
 
     def format_price_change_message(self, apt: Dict, old_price: int, new_price: int,
                                      rich: bool = True) -> str:
@@ -127,19 +183,19 @@ class NotificationManager:
         if change < 0 and abs(change_pct) >= 5:
             recommendation = "\n\n⭐ <b>ירידה משמעותית - שווה לבדוק!</b>"
 
-        message = (
-            f"{emoji} <b>{change_text}</b>\n"
-            f"{'─' * 30}\n\n"
-            f"<b>📍 {apt.get('title', 'ללא כותרת')}</b>\n\n"
-            f"💵 <b>מחיר קודם:</b> ₪{old_price:,}\n"
-            f"💰 <b>מחיר חדש:</b> ₪{new_price:,}\n"
-            f"{change_emoji} <b>שינוי:</b> ₪{abs(change):,} ({change_pct:+.1f}%)"
-            f"{recommendation}\n\n"
-            f"🔗 <a href='{apt.get('link', '')}'>לצפייה בדירה</a>"
-            f"{self.get_server_signature()}"
-        )
-
-        return message
+        return _TPL_PRICE_CHANGE % {
+            'emoji': emoji,
+            'change_text': change_text,
+            'title': apt.get('title', 'ללא כותרת'),
+            'old_price': f"{old_price:,}",
+            'new_price': f"{new_price:,}",
+            'change_emoji': change_emoji,
+            'change': f"{abs(change):,}",
+            'change_pct': f"{change_pct:+.1f}",
+            'recommendation': recommendation,
+            'link': apt.get('link', ''),
+            'signature': self.get_server_signature(),
+        }
 
     def format_removed_message(self, apt: Dict) -> str:
         """Format message for removed apartment"""
@@ -153,60 +209,57 @@ class NotificationManager:
             except:
                 pass
 
-        message = (
-            f"🗑️ <b>דירה הוסרה</b>\n"
-            f"{'─' * 30}\n\n"
-            f"<b>📍 {apt.get('title', 'ללא כותרת')}</b>\n"
-            f"💰 <b>מחיר אחרון:</b> ₪{apt.get('price', 0):,}\n"
-            f"📅 <b>ימים בשוק:</b> {days_on_market}\n"
-        )
-
-        return message
+        return _TPL_REMOVED % {
+            'title': apt.get('title', 'ללא כותרת'),
+            'price': f"{apt.get('price', 0):,}",
+            'days': days_on_market,
+        }
 
     def format_daily_digest(self, new_apartments: List[Dict], price_changes: List[Dict],
                            removed: List[Dict]) -> str:
         """Format daily digest message"""
-        message = "📬 <b>סיכום יומי - Yad2 Monitor</b>\n"
-        message += "─" * 30 + "\n\n"
+        parts = []
+        append = parts.append
+        append("📬 <b>סיכום יומי - Yad2 Monitor</b>\n")
+        append(SEPARATOR + "\n\n")
 
         # Summary counts
-        message += f"📊 <b>סיכום:</b>\n"
-        message += f"  🆕 דירות חדשות: {len(new_apartments)}\n"
-        message += f"  💰 שינויי מחיר: {len(price_changes)}\n"
-        message += f"  🗑️ הוסרו: {len(removed)}\n\n"
+        append("📊 <b>סיכום:</b>\n")
+        append(f"  🆕 דירות חדשות: {len(new_apartments)}\n")
+        append(f"  💰 שינויי מחיר: {len(price_changes)}\n")
+        append(f"  🗑️ הוסרו: {len(removed)}\n\n")
 
         # Top new apartments (by lowest price)
         if new_apartments:
-            message += "🆕 <b>דירות חדשות (הזולות ביותר):</b>\n"
+            append("🆕 <b>דירות חדשות (הזולות ביותר):</b>\n")
             sorted_new = sorted(new_apartments, key=lambda x: x.get('price', float('inf')))
             for apt in sorted_new[:5]:
                 price = f"₪{apt.get('price', 0):,}" if apt.get('price') else "לא צוין"
-                message += f"  • {apt.get('title', '')[:35]} - {price}\n"
+                append(f"  • {apt.get('title', '')[:35]} - {price}\n")
             if len(new_apartments) > 5:
-                message += f"  ... ועוד {len(new_apartments) - 5}\n"
-            message += "\n"
+                append(f"  ... ועוד {len(new_apartments) - 5}\n")
+            append("\n")
 
         # Price drops
         drops = [p for p in price_changes if p.get('change', 0) < 0]
         if drops:
-            message += "📉 <b>ירידות מחיר:</b>\n"
+            append("📉 <b>ירידות מחיר:</b>\n")
             sorted_drops = sorted(drops, key=lambda x: x.get('change_pct', 0))
             for p in sorted_drops[:5]:
                 apt = p.get('apartment', {})
-                message += f"  • {apt.get('title', '')[:30]}: {p.get('change_pct', 0):.1f}%\n"
-            message += "\n"
+                append(f"  • {apt.get('title', '')[:30]}: {p.get('change_pct', 0):.1f}%\n")
+            append("\n")
 
         # Market stats if available
         total_active = self.db.get_setting('total_active_listings')
         if total_active:
-            message += f"📈 <b>שוק:</b> {total_active} דירות פעילות\n"
+            append(f"📈 <b>שוק:</b> {total_active} דירות פעילות\n")
 
-        message += f"\n<i>נשלח: {datetime.now().strftime('%d/%m/%Y %H:%M')}</i>"
+        append(f"\n<i>נשלח: {_now_stamp()}</i>")
 
-        return message
+        return "".join(parts)
 
-    def send_telegram_message(self, message: str, max_retries: int = 3,
-                              disable_preview: bool = False) -> bool:
+    def send_telegram_message(self, message: str, disable_preview: bool = False) -> bool:
         """Send message via Telegram"""
         if not self.telegram_token or not self.telegram_chat_id:
             logger.warning("Telegram credentials not configured")
@@ -217,41 +270,36 @@ class NotificationManager:
         if elapsed < self.min_message_interval:
             time.sleep(self.min_message_interval - elapsed)
 
-        for attempt in range(max_retries):
-            try:
-                url = f"https://api.telegram.org/bot{self.telegram_token}/sendMessage"
-                data = {
-                    'chat_id': self.telegram_chat_id,
-                    'text': message,
-                    'parse_mode': 'HTML',
-                    'disable_web_page_preview': disable_preview
-                }
-
-                response = requests.post(url, data=data, timeout=10)
-                self.last_message_time = time.time()
+        try:
+            url = f"https://api.telegram.org/bot{self.telegram_token}/sendMessage"
+            data = {
+                'chat_id': self.telegram_chat_id,
+                'text': message,
+                'parse_mode': 'HTML',
+                'disable_web_page_preview': disable_preview
+            }
 
-                if response.status_code == 200:
-                    return True
-                elif response.status_code == 429:
-                    retry_after = int(response.headers.get('Retry-After', 30))
-                    logger.warning(f"Rate limited, waiting {retry_after}s")
-                    time.sleep(retry_after)
-                    continue
-                else:
-                    logger.error(f"Telegram error: {response.status_code} - {response.text}")
-                    if attempt < max_retries - 1:
-                        time.sleep(2 ** attempt)
-                        continue
-                    return False
+            response = self.session.post(url, data=data, timeout=10)
+            self.last_message_time = time.time()
+            if response.status_code == 429:
+                # Hold this and later sends for retry_after, then try once more
+                try:
+                    retry_after = float(response.json().get('parameters', {}).get('retry_after', 0))
+                except ValueError:
+                    retry_after = float(response.headers.get('Retry-After') or 0)
+                logger.warning(f"Telegram rate limit hit; holding sends for {retry_after:.0f}s")
+                time.sleep(retry_after)
+                response = self.session.post(url, data=data, timeout=10)
+                self.last_message_time = time.time()
 
-            except Exception as e:
-                logger.error(f"Failed to send Telegram message: {e}")
-                if attempt < max_retries - 1:
-                    time.sleep(2 ** attempt)
-                    continue
-                return False
+            if response.status_code == 200:
+                return True
+            logger.error(f"Telegram error: {response.status_code} - {response.text}")
+            return False
 
-        return False
+        except Exception as e:
+            logger.error(f"Failed to send Telegram message: {e}")
+            return False
 
     def send_telegram_photo(self, photo_url: str, caption: str) -> bool:
         """Send photo with caption via Telegram"""
@@ -266,7 +314,7 @@ class NotificationManager:
                 'caption': caption,
                 'parse_mode': 'HTML'
             }
-            response = requests.post(url, data=data, timeout=15)
+            response = self.session.post(url, data=data, timeout=15)
             return response.status_code == 200
         except Exception as e:
             logger.error(f"Failed to send photo: {e}")
@@ -283,17 +331,43 @@ class NotificationManager:
                 'chat_id': self.telegram_chat_id,
                 'text': message,
                 'parse_mode': 'HTML',
-                'reply_markup': json.dumps({
+                'reply_markup': json_dumps({
                     'inline_keyboard': buttons
                 })
             }
-            response = requests.post(url, json=data, timeout=10)
+            response = self.session.post(url, data=json_dumps(data).encode('utf-8'),
+                                         headers={'Content-Type': 'application/json'}, timeout=10)
             return response.status_code == 200
         except Exception as e:
             logger.error(f"Failed to send message with buttons: {e}")
             return False
 
-    def notify_new_apartment(self, apt: Dict):
+    def notify_changes(self, new_apartments: List[Dict], price_changes: List[Dict]):
+        """Notify one scrape's changes, sharing the user lookup and coalescing legacy messages"""
+        target_users = None
+        if self.telegram_bot and self.instant_notifications:
+            target_users = [u['chat_id'] for u in self.db.get_all_active_users()]
+        legacy_messages = []
+
+        for apt in new_apartments:
+            self.notify_new_apartment(apt, target_users, legacy_messages)
+        for change in price_changes:
+            self.notify_price_change(change['apartment'], change['old_price'], change['new_price'],
+                                     target_users, legacy_messages)
+
+        # Fold legacy single-chat notifications into as few Telegram messages as fit
+        for chunk in self._pack_messages(legacy_messages):
+            self.send_telegram_message(chunk)
+
+    def _send_legacy(self, message: str, collect: Optional[List[str]]):
+        """Send a single-chat notification now, or add it to a batch being collected"""
+        if collect is not None:
+            collect.append(message)
+        else:
+            self.send_telegram_message(message)
+
+    def notify_new_apartment(self, apt: Dict, target_users: List[str] = None,
+                             collect: Optional[List[str]] = None):
         """Send notification for new apartment to all active users"""
         if not self.should_notify(apt, 'new'):
             return
@@ -301,16 +375,14 @@ class NotificationManager:
         # Multi-user notification via TelegramBot
         if self.telegram_bot and self.instant_notifications:
             try:
-                self.telegram_bot.notify_new_apartment(apt)
+                self.telegram_bot.notify_new_apartment(apt, target_users)
             except Exception as e:
                 logger.error(f"Error sending multi-user notification: {e}", exc_info=True)
                 # Fallback to legacy single-user notification
-                message = self.format_new_apartment_message(apt)
-                self.send_telegram_message(message)
+                self._send_legacy(self.format_new_apartment_message(apt), collect)
         elif self.instant_notifications:
             # Legacy single-user notification
-            message = self.format_new_apartment_message(apt)
-            self.send_telegram_message(message)
+            self._send_legacy(self.format_new_apartment_message(apt), collect)
 
         # Store for daily digest (thread-safe)
         with self._daily_lock:
@@ -320,7 +392,8 @@ class NotificationManager:
                 'timestamp': datetime.now().isoformat()
             })
 
-    def notify_price_change(self, apt: Dict, old_price: int, new_price: int):
+    def notify_price_change(self, apt: Dict, old_price: int, new_price: int,
+                            target_users: List[str] = None, collect: Optional[List[str]] = None):
         """Send notification for price change to all active users"""
         if not self.should_notify(apt, 'price_change'):
             return
@@ -328,16 +401,14 @@ class NotificationManager:
         # Multi-user notification via TelegramBot
         if self.telegram_bot and self.instant_notifications:
             try:
-                self.telegram_bot.notify_price_change(apt, old_price)
+                self.telegram_bot.notify_price_change(apt, old_price, target_users)
             except Exception as e:
                 logger.error(f"Error sending multi-user notification: {e}", exc_info=True)
                 # Fallback to legacy single-user notification
-                message = self.format_price_change_message(apt, old_price, new_price)
-                self.send_telegram_message(message)
+                self._send_legacy(self.format_price_change_message(apt, old_price, new_price), collect)
         elif self.instant_notifications:
             # Legacy single-user notification
-            message = self.format_price_change_message(apt, old_price, new_price)
-            self.send_telegram_message(message)
+            self._send_legacy(self.format_price_change_message(apt, old_price, new_price), collect)
 
         # Store for daily digest (thread-safe)
         with self._daily_lock:
@@ -377,16 +448,23 @@ class NotificationManager:
                     apt, change['old_price'], change['new_price']
                 ))
 
-        if not messages:
-            return
-
-        # Send in parallel with rate limiting
-        with ThreadPoolExecutor(max_workers=3) as executor:
-            for i, msg in enumerate(messages):
-                # Stagger messages to avoid rate limiting
-                if i > 0:
-                    time.sleep(0.5)
-                executor.submit(self.send_telegram_message, msg)
+        # Fold notifications into as few Telegram messages as fit
+        for chunk in self._pack_messages(messages):
+            self.send_telegram_message(chunk, disable_preview=True)
+
+    @staticmethod
+    def _pack_messages(messages: List[str], limit: int = TELEGRAM_PACK_LIMIT) -> List[str]:
+        """Join messages with a separator into chunks under Telegram's length limit"""
+        chunks = []
+        current = ""
+        for msg in messages:
+            if current and len(current) + len(PACK_SEPARATOR) + len(msg) > limit:
+                chunks.append(current)
+                current = ""
+            current = f"{current}{PACK_SEPARATOR}{msg}" if current else msg
+        if current:
+            chunks.append(current)
+        return chunks
 
     def send_daily_digest(self):
         """Send daily digest if enabled and not already sent today"""
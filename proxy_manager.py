@@ -3,17 +3,24 @@ Proxy Manager Module for Yad2 Monitor
 Handles proxy rotation, health checking, and failover
 """
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import random
 import time
 import os
+import atexit
 from typing import Dict, List, Optional, Tuple
 from datetime import datetime, timedelta
 from collections import defaultdict
 import logging
-import json
+
+from json_utils import json_bytes, json_loads
 
 logger = logging.getLogger(__name__)
 
+# Per-request proxy stats are flushed to disk at most this often (seconds)
+PROXY_STATS_SAVE_INTERVAL = 60
+
 
 class ProxyManager:
     """Manages proxy rotation and health monitoring"""
@@ -31,15 +38,18 @@ class ProxyManager:
         })
         self.current_proxy_index = 0
         self.cooldown_proxies: Dict[str, datetime] = {}
+        self._stats_dirty = False
+        self._last_stats_save = time.monotonic()
         self.load_proxies()
+        atexit.register(self.flush_stats)
 
     def load_proxies(self):
         """Load proxies from file or environment"""
         # Try loading from file
         if os.path.exists(self.proxy_file):
             try:
-                with open(self.proxy_file, 'r') as f:
-                    data = json.load(f)
+                with open(self.proxy_file, 'rb') as f:
+                    data = json_loads(f.read())
                     self.proxies = data.get('proxies', [])
                     self.proxy_stats = data.get('stats', {})
                     logger.info(f"Loaded {len(self.proxies)} proxies from {self.proxy_file}")
@@ -95,16 +105,32 @@ class ProxyManager:
             return None
 
     def save_proxies(self):
-        """Save proxies and stats to file"""
+        """Save proxies and stats to file (atomically, via a temp file and rename)"""
+        tmp_file = f"{self.proxy_file}.tmp"
         try:
-            with open(self.proxy_file, 'w') as f:
-                json.dump({
-                    'proxies': self.proxies,
-                    'stats': dict(self.proxy_stats)
-                }, f, indent=2, default=str)
+            state = {
+                'proxies': self.proxies,
+                'stats': dict(self.proxy_stats)
+            }
+            with open(tmp_file, 'wb') as f:
+                f.write(json_bytes(state, default=str))
+            os.replace(tmp_file, self.proxy_file)
+            self._stats_dirty = False
+            self._last_stats_save = time.monotonic()
         except Exception as e:
             logger.error(f"Error saving proxies: {e}")
 
+    def _stats_changed(self):
+        """Mark stats dirty and save if the last save is older than the flush interval"""
+        self._stats_dirty = True
+        if time.monotonic() - self._last_stats_save >= PROXY_STATS_SAVE_INTERVAL:
+            self.save_proxies()
+
+    def flush_stats(self):
+        """Write pending stats to disk"""
+        if self._stats_dirty:
+            self.save_proxies()
+
     def add_proxy(self, host: str, port: int, user: str = None, password: str = None):
         """Add a new proxy"""
         proxy = {
@@ -235,7 +261,7 @@ class ProxyManager:
         if key in self.cooldown_proxies:
             del self.cooldown_proxies[key]
 
-        self.save_proxies()
+        self._stats_changed()
 
     def report_failure(self, proxy: Dict, error_type: str = 'unknown'):
         """Report failed request through proxy"""
@@ -250,7 +276,7 @@ class ProxyManager:
         cooldown_minutes = min(5 * stats['consecutive_fails'], 60)
         self.cooldown_proxies[key] = datetime.now() + timedelta(minutes=cooldown_minutes)
 
-        self.save_proxies()
+        self._stats_changed()
 
     def test_proxy(self, proxy: Dict, test_url: str = "https://httpbin.org/ip", timeout: int = 10) -> Tuple[bool, float]:
         """Test if proxy is working"""
@@ -366,6 +392,16 @@ class ProxyRotator:
         self.current_proxy = None
         self.requests_on_current = 0
         self.max_requests_per_proxy = 10
+        # urllib3 keeps a separate keep-alive pool per proxy within one session.
+        # Like the direct scraper session, connection errors, timeouts and 5xx are retried
+        # with backoff; 429 (even with Retry-After) is returned to rotate the proxy.
+        retry = Retry(total=3, backoff_factor=2, status_forcelist=(500, 502, 503, 504),
+                      allowed_methods=frozenset(['GET']), raise_on_status=False,
+                      respect_retry_after_header=False)
+        adapter = HTTPAdapter(max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
 
     def get_session(self) -> requests.Session:
         """Get a requests session with proxy configured"""
@@ -393,7 +429,7 @@ class ProxyRotator:
 
             try:
                 start = time.time()
-                response = requests.get(
+                response = self.session.get(
                     url,
                     headers=headers,
                     proxies=proxies,
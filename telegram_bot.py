@@ -3,14 +3,77 @@ Telegram Bot Module for Yad2 Monitor
 Handles webhook, commands, and inline keyboard interactions
 """
 import os
-import json
+import time
 import logging
+import threading
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from typing import Dict, List, Optional
 from datetime import datetime
 
+from json_utils import json_bytes, json_dumps
+
 logger = logging.getLogger(__name__)
 
+JSON_HEADERS = {'Content-Type': 'application/json'}
+
+
+# Apartment notification body, filled with %-formatting once per apartment
+_TPL_APARTMENT = (
+    "\n%s %s\n\n<b>%s</b>\n\n"
+    "📍 <b>מיקום:</b> %s\n"
+    "💰 <b>מחיר:</b> %s\n"
+    "🛏️ <b>חדרים:</b> %s\n"
+    "📏 <b>מ\"ר:</b> %s\n"
+    "🏢 <b>קומה:</b> %s\n"
+)
+
+# Telegram Bot API limits: ~30 messages/s overall, ~1 message/s per chat
+GLOBAL_SEND_RATE = 25
+CHAT_SEND_RATE = 1
+CHAT_SEND_BURST = 3
+# After a 429 the global send rate halves (not below 1/8 of GLOBAL_SEND_RATE) and
+# grows back by this many messages/s per successful send
+SEND_RATE_RECOVERY_STEP = 0.5
+# Times a send is retried after a 429, once its retry_after hold has passed
+SEND_RETRIES_ON_429 = 2
+
+
+class TokenBucket:
+    """Thread-safe token bucket; acquire() blocks until a token is available"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.max_rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def backoff(self, hold_seconds: float):
+        """Halve the rate and hand out no tokens for hold_seconds (multiplicative decrease)"""
+        with self._lock:
+            self.rate = max(self.max_rate / 8, self.rate / 2)
+            self.tokens = min(self.tokens, 0) - hold_seconds * self.rate
+
+    def recover(self, step: float):
+        """Raise the rate back towards its configured value (additive increase)"""
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + step)
+
 
 class TelegramBot:
     """Telegram bot for multi-user apartment monitoring"""
@@ -19,8 +82,49 @@ class TelegramBot:
         self.token = token
         self.db = database
         self.base_url = f"https://api.telegram.org/bot{token}"
+        # GET 5xx are retried by urllib3; POSTs are not resent, as Telegram may already have
+        # delivered them. 429 (even with Retry-After) is left to _post so the send rate can adapt
+        retry = Retry(total=3, backoff_factor=1, status_forcelist=(500, 502, 503, 504),
+                      allowed_methods=frozenset(['GET']), raise_on_status=False,
+                      respect_retry_after_header=False)
+        self.session = requests.Session()
+        self.session.mount('https://', HTTPAdapter(pool_maxsize=8, max_retries=retry))
         self.scrape_callback = None  # Set by monitor to allow /scrape command
 
+        # Outgoing message rate limits, so bursts queue locally instead of hitting 429
+        self._send_bucket = TokenBucket(GLOBAL_SEND_RATE, GLOBAL_SEND_RATE)
+        self._chat_buckets: Dict[str, TokenBucket] = {}
+        self._chat_buckets_lock = threading.Lock()
+
+    def _throttle(self, chat_id: str):
+        """Block until both the per-chat and the global send budget allow a message"""
+        with self._chat_buckets_lock:
+            bucket = self._chat_buckets.get(chat_id)
+            if bucket is None:
+                bucket = self._chat_buckets[chat_id] = TokenBucket(CHAT_SEND_RATE, CHAT_SEND_BURST)
+        bucket.acquire()
+        self._send_bucket.acquire()
+
+    def _post(self, url: str, payload: Dict) -> requests.Response:
+        """POST a JSON payload to the Bot API, adapting the send rate to Telegram's pushback"""
+        body = json_bytes(payload)
+        response = self.session.post(url, data=body, headers=JSON_HEADERS, timeout=10)
+        for _ in range(SEND_RETRIES_ON_429):
+            if response.status_code != 429:
+                break
+            # Slow every sender down and hold sends for retry_after, then try again
+            try:
+                retry_after = float(response.json().get('parameters', {}).get('retry_after', 0))
+            except ValueError:
+                retry_after = float(response.headers.get('Retry-After') or 0)
+            logger.warning(f"Telegram rate limit hit; holding sends for {retry_after:.0f}s")
+            self._send_bucket.backoff(retry_after)
+            self._send_bucket.acquire()
+            response = self.session.post(url, data=body, headers=JSON_HEADERS, timeout=10)
+        if response.ok:
+            self._send_bucket.recover(SEND_RATE_RECOVERY_STEP)
+        return response
+
     def set_my_commands(self) -> bool:
         """Register bot commands so they appear in Telegram's menu"""
         try:
@@ -38,7 +142,7 @@ class TelegramBot:
                 {"command": "scrape", "description": "סריקה מיידית של יד2"},
                 {"command": "analytics", "description": "תובנות שוק"},
             ]
-            response = requests.post(url, json={"commands": commands}, timeout=10)
+            response = self._post(url, {"commands": commands})
             result = response.json()
             if result.get('ok'):
                 logger.info("✓ Bot commands registered with Telegram")
@@ -58,7 +162,7 @@ class TelegramBot:
                 'url': webhook_url,
                 'allowed_updates': ['message', 'callback_query']
             }
-            response = requests.post(url, json=data, timeout=10)
+            response = self._post(url, data)
             result = response.json()
 
             if result.get('ok'):
@@ -74,6 +178,7 @@ class TelegramBot:
     def send_message(self, chat_id: str, text: str, parse_mode: str = 'HTML',
                     reply_markup: Optional[Dict] = None) -> bool:
         """Send a text message to a chat"""
+        self._throttle(chat_id)
         try:
             url = f"{self.base_url}/sendMessage"
             data = {
@@ -82,9 +187,9 @@ class TelegramBot:
                 'parse_mode': parse_mode
             }
             if reply_markup:
-                data['reply_markup'] = json.dumps(reply_markup)
+                data['reply_markup'] = json_dumps(reply_markup)
 
-            response = requests.post(url, json=data, timeout=10)
+            response = self._post(url, data)
             result = response.json()
 
             if not result.get('ok'):
@@ -105,7 +210,7 @@ class TelegramBot:
                 data['text'] = text
             data['show_alert'] = show_alert
 
-            response = requests.post(url, json=data, timeout=10)
+            response = self._post(url, data)
             return response.json().get('ok', False)
         except Exception as e:
             logger.error(f"Error answering callback: {e}", exc_info=True)
@@ -462,8 +567,6 @@ class TelegramBot:
         self.send_message(chat_id, "🔍 <b>מתחיל סריקה מיידית (עמוד ראשון)...</b>")
 
         try:
-            import threading
-            import time as _time
             def run_scrape():
                 try:
                     apartments = self.scrape_callback()
@@ -493,8 +596,6 @@ class TelegramBot:
                             text += f"\n🔗 <a href=\"{link}\">צפייה ביד2</a>"
 
                         self.send_message(chat_id, text)
-                        if i < len(apartments) - 1:
-                            _time.sleep(0.5)
 
                 except Exception as e:
                     self.send_message(chat_id, f"❌ שגיאה בסריקה: {e}")
@@ -597,17 +698,7 @@ class TelegramBot:
             emoji = "🏠"
             header = "<b>עדכון דירה</b>"
 
-        text = f"""
-{emoji} {header}
-
-<b>{title}</b>
-
-📍 <b>מיקום:</b> {location}
-💰 <b>מחיר:</b> {price}
-🛏️ <b>חדרים:</b> {rooms}
-📏 <b>מ"ר:</b> {sqm}
-🏢 <b>קומה:</b> {floor}
-"""
+        text = _TPL_APARTMENT % (emoji, header, title, location, price, rooms, sqm, floor)
 
         if notification_type == 'price_drop' and apartment.get('old_price'):
             text += f"\n💸 <b>מחיר קודם:</b> ₪{apartment['old_price']:,}"
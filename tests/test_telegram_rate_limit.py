@@ -0,0 +1,74 @@
+"""
+Telegram 429 handling: urllib3 must hand rate limits back to the senders
+Run with: python -m unittest discover tests
+"""
+import json
+import os
+import sys
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from notifications import NotificationManager
+from telegram_bot import SEND_RETRIES_ON_429, TelegramBot
+
+
+class RateLimitedHandler(BaseHTTPRequestHandler):
+    """Answers every POST with a Bot API 429 carrying Retry-After"""
+    hits = 0
+
+    def do_POST(self):
+        type(self).hits += 1
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        body = json.dumps({'ok': False, 'error_code': 429,
+                           'parameters': {'retry_after': 0}}).encode('utf-8')
+        self.send_response(429)
+        self.send_header('Retry-After', '1')
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TelegramRateLimitTest(unittest.TestCase):
+
+    def setUp(self):
+        RateLimitedHandler.hits = 0
+        self.server = HTTPServer(('127.0.0.1', 0), RateLimitedHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_port}/sendMessage"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    @staticmethod
+    def _plain_http(session):
+        """Use the session's https adapter (and its Retry) for the local http server"""
+        session.mount('http://', session.get_adapter('https://'))
+
+    def test_notifier_session_returns_first_429(self):
+        notifier = NotificationManager(database=None)
+        self._plain_http(notifier.session)
+        response = notifier.session.post(self.url, data={'text': 'x'}, timeout=5)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(RateLimitedHandler.hits, 1)
+
+    def test_bot_post_backs_off_on_first_429(self):
+        bot = TelegramBot('token', database=None)
+        self._plain_http(bot.session)
+        rate = bot._send_bucket.rate
+        response = bot._post(self.url, {'chat_id': '1', 'text': 'x'})
+        self.assertEqual(response.status_code, 429)
+        # One send plus _post's own resends; none absorbed by urllib3
+        self.assertEqual(RateLimitedHandler.hits, 1 + SEND_RETRIES_ON_429)
+        self.assertLess(bot._send_bucket.rate, rate)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -6,6 +6,10 @@ Provides validation helpers to prevent injection attacks and ensure data integri
 import re
 from typing import Optional, Tuple, List
 
+# Compiled once; validators run on every API request
+_APARTMENT_ID_RE = re.compile(r'^[a-zA-Z0-9_-]+$')
+_URL_SCHEME_RE = re.compile(r'https?://', re.IGNORECASE)
+
 
 class ValidationError(Exception):
     """Custom exception for validation errors with user-friendly messages."""
@@ -29,7 +33,7 @@ def validate_apartment_id(apt_id: str) -> str:
         raise ValidationError("מזהה דירה חייב להיות מחרוזת לא ריקה / Apartment ID must be a non-empty string")
 
     # Allow alphanumeric, underscore, hyphen
-    if not re.match(r'^[a-zA-Z0-9_-]+$', apt_id):
+    if not _APARTMENT_ID_RE.match(apt_id):
         raise ValidationError("מזהה דירה מכיל תווים לא חוקיים / Apartment ID contains invalid characters")
 
     if len(apt_id) > 100:
@@ -245,7 +249,7 @@ def validate_url(url: str) -> str:
         raise ValidationError("URL חייב להיות מחרוזת לא ריקה / URL must be a non-empty string")
 
     # Basic URL validation
-    if not re.match(r'https?://', url, re.IGNORECASE):
+    if not _URL_SCHEME_RE.match(url):
         raise ValidationError("URL חייב להתחיל ב-http:// או https:// / URL must start with http:// or https://")
 
     if len(url) > 2000:
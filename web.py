@@ -4,6 +4,7 @@ Flask-based dashboard with REST endpoints
 """
 from flask import Flask, jsonify, request, render_template, render_template_string, send_file
 from flask_cors import CORS
+from flask.json.provider import DefaultJSONProvider
 from datetime import datetime
 import os
 import json
@@ -11,8 +12,20 @@ import logging
 import tempfile
 from functools import wraps
 
+from json_utils import API_OPTIONS, json_dumps, json_loads
+
 logger = logging.getLogger(__name__)
 
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson; unknown types (dates) go through Flask's default"""
+
+    def dumps(self, obj, **kwargs) -> str:
+        return json_dumps(obj, default=self.default, option=API_OPTIONS)
+
+    def loads(self, s, **kwargs):
+        return json_loads(s)
+
 # Embedded dashboard HTML - inline to avoid import issues
 EMBEDDED_DASHBOARD_HTML = '''<!DOCTYPE html>
 <html lang="he" dir="rtl">
@@ -298,6 +311,7 @@ def create_web_app(database, analytics=None, telegram_bot=None):
     app = Flask(__name__,
                 template_folder=template_dir,
                 static_folder=static_dir)
+    app.json = OrjsonProvider(app)
 
     # Log template and static paths for debugging
     logger.info(f"Base directory: {base_dir}")
@@ -0,0 +1,62 @@
+"""
+Hot string helpers for listing parsing
+Kept free of lxml/requests and fully annotated so the module can be
+compiled with mypyc (`mypyc yad2_fast.py`); the compiled extension is
+picked up in place of this file automatically when present.
+"""
+import re
+from typing import Optional, Tuple
+
+import xxhash
+
+ITEM_PATH = '/realestate/item/'
+
+_DIGITS_RE = re.compile(r'\d+')
+_DECIMAL_RE = re.compile(r'[\d.]+')
+_ITEM_ID_RE = re.compile(r'/realestate/item/([A-Za-z0-9]+)')
+
+
+def extract_price(text: Optional[str]) -> Optional[int]:
+    """Largest number in text, ignoring thousands separators"""
+    if not text:
+        return None
+    # Thousands separators are the only thing that can split a price's digits
+    numbers = _DIGITS_RE.findall(text.replace(',', ''))
+    return max(map(int, numbers)) if numbers else None
+
+
+def apartment_id_from_href(href: str) -> Optional[str]:
+    """Item ID from a /realestate/item/<id> link, or None"""
+    # Cheap substring probe first; only anchor the regex where it can match
+    idx = href.find(ITEM_PATH)
+    if idx < 0:
+        return None
+    m = _ITEM_ID_RE.match(href, idx) or _ITEM_ID_RE.search(href, idx + 1)
+    return m.group(1) if m else None
+
+
+def hash_text(text: str) -> str:
+    """Short non-cryptographic ID for listings without a link or data-id"""
+    return xxhash.xxh3_64_hexdigest(text.encode())[:12]
+
+
+def parse_item_info(item_info: str) -> Tuple[Optional[float], Optional[int], Optional[int]]:
+    """Rooms, sqm and floor from an item info line like '3 חדרים · קומה 2 · 70 מ"ר'"""
+    rooms: Optional[float] = None
+    sqm: Optional[int] = None
+    floor: Optional[int] = None
+    for part in item_info.split('·'):
+        part = part.strip()
+        if 'חדרים' in part or 'חדר' in part:
+            num = _DECIMAL_RE.search(part)
+            if num:
+                rooms = float(num.group())
+        elif 'מ"ר' in part or 'מטר' in part:
+            num = _DIGITS_RE.search(part)
+            if num:
+                sqm = int(num.group())
+        elif 'קומה' in part:
+            num = _DIGITS_RE.search(part)
+            if num:
+                floor = int(num.group())
+    return rooms, sqm, floor